@@ -4,9 +4,11 @@ from web3 import Web3
 # Адреса контрактов (Arbitrum)
 ZERO_ADDRESS = Web3.to_checksum_address("0x0000000000000000000000000000000000000000")
 CRV_ADDRESS = Web3.to_checksum_address("0x11cDb42B0EB46D95f990BeDD4695A6e3fA034978")
+WETH_ADDRESS = Web3.to_checksum_address("0x82aF49447D8a07e3bd95BD0d56f35241523fBab1")
 CRVUSD_ADDRESS = Web3.to_checksum_address("0x498Bf2B1e120FeD3ad3D42EA2165E9b73f99C1e5")
 ONEINCH_ROUTER_ADDRESS = Web3.to_checksum_address("0x111111125421ca6dc452d289314280a0f8842a65")
 GMAC_CRVUSD_ETH_POOL_ADDRESS = Web3.to_checksum_address("0x96aAF8f6a2e3f45aAf548b753a0e004211E0ad63")
 GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS = Web3.to_checksum_address("0x986F70E64bE25123293F90f4BbE3AD1e37557906")
 GMAC_CRVUSD_ETH_GAUGE_ADDRESS = Web3.to_checksum_address("0xDa9A503E67A075AF2c3Ea840256b02891535471A")
 STAKE_DAO_HARVESTER_ADDRESS = Web3.to_checksum_address("0x93b4B9bd266fFA8AF68e39EDFa8cFe2A62011Ce0")
+ARBITRUM_NODE_INTERFACE_ADDRESS = Web3.to_checksum_address("0x00000000000000000000000000000000000000C8")
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import threading
+import time
+
+from web3 import AsyncWeb3, Web3, WebSocketProvider
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+from config import ARBITRUM_WS_RPC
+from utils import fees_for_base_fee, get_gas_fees
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+HTTP_POLL_INTERVAL = 0.25  # Опрос eth_blockNumber, пока WebSocket недоступен
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+RECEIPT_TIMEOUT = 120
+PRIORITY_FEE_REFRESH_BLOCKS = 240  # Медиана приоритета меняется медленно: обновляем её примерно раз в минуту
+
+
+class BlockClock:
+    """Общие часы блоков: новые блоки и baseFee приходят по подписке newHeads через WebSocket,
+    а при её недоступности — опросом по HTTP"""
+
+    def __init__(self, web3: Web3, ws_url: str = ARBITRUM_WS_RPC, poll_interval: float = HTTP_POLL_INTERVAL):
+        self.web3 = web3
+        self.ws_url = ws_url
+        self.poll_interval = poll_interval
+        self.block_number = 0
+        self.base_fee: int | None = None
+        self.connected = False
+
+        self._priority_fee: int | None = None
+        self._priority_fee_block = 0
+
+        self._block_listeners = []
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._reconnect_delay = RECONNECT_DELAY
+        self._thread = threading.Thread(target=self._run, name="block-clock", daemon=True)
+
+    def add_block_listener(self, callback) -> None:
+        """callback(block_number) вызывается на каждый новый блок"""
+        self._block_listeners.append(callback)
+
+    def start(self) -> "BlockClock":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def gas_fees(self) -> dict:
+        """Комиссии для следующей транзакции. Пока подписка активна, baseFee берётся из последнего заголовка
+        без запроса к ноде, а история комиссий для приоритета запрашивается раз в PRIORITY_FEE_REFRESH_BLOCKS
+        блоков; при опросе по HTTP история запрашивается при каждом вызове"""
+        with self._condition:
+            base_fee, priority = self.base_fee, self._priority_fee
+            fresh = self.block_number - self._priority_fee_block < PRIORITY_FEE_REFRESH_BLOCKS
+        if self.connected and base_fee is not None and priority is not None and fresh:
+            return fees_for_base_fee(base_fee, priority)
+
+        fees = get_gas_fees(self.web3)
+        with self._condition:
+            self._priority_fee = fees["maxPriorityFeePerGas"]
+            self._priority_fee_block = self.block_number
+        return fees
+
+    def wait_for_block(self, block_number: int, timeout: float) -> bool:
+        """Ждёт, пока часы дойдут до block_number; False — если истёк timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.block_number >= block_number, timeout)
+
+    def wait_for_receipt(self, tx_hash, timeout: float = RECEIPT_TIMEOUT):
+        """Квитанция транзакции: проверяется на каждом новом блоке, а не по таймеру"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.web3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                pass
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeExhausted(f"Транзакция {Web3.to_hex(tx_hash)} не включена в блок за {timeout} с")
+            # Если блоки перестали приходить, всё равно перепроверяем раз в несколько интервалов опроса
+            self.wait_for_block(self.block_number + 1, min(remaining, self.poll_interval * 8))
+
+    def _on_block(self, block_number: int, base_fee: int | None = None) -> None:
+        with self._condition:
+            if block_number <= self.block_number:
+                return
+            self.block_number = block_number
+            if base_fee is not None:
+                self.base_fee = base_fee
+            self._condition.notify_all()
+
+        for callback in self._block_listeners:
+            try:
+                callback(block_number)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика блока {block_number}: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self.ws_url:
+                self._poll(None)
+                return
+
+            try:
+                asyncio.run(self._listen())
+            except Exception as e:
+                logger.warning(
+                    f"Подписка WebSocket прервана: {e}; опрос по HTTP {self._reconnect_delay:.0f} с до переподключения"
+                )
+            # baseFee из заголовков устарел: пока нет подписки, комиссии снова берутся из истории
+            self.connected = False
+            self.base_fee = None
+            self._poll(self._reconnect_delay)
+            self._reconnect_delay = min(self._reconnect_delay * 2, MAX_RECONNECT_DELAY)
+
+    def _poll(self, duration: float | None) -> None:
+        """Резервный режим: опрос eth_blockNumber по HTTP в течение duration секунд (None — бессрочно)"""
+        deadline = None if duration is None else time.monotonic() + duration
+        while not self._stop.is_set() and (deadline is None or time.monotonic() < deadline):
+            try:
+                self._on_block(self.web3.eth.block_number)
+            except Exception as e:
+                logger.warning(f"Не удалось получить номер блока: {e}")
+            self._stop.wait(self.poll_interval)
+
+    async def _listen(self) -> None:
+        # Переподключением управляем сами, чтобы между попытками работал опрос по HTTP
+        async with AsyncWeb3(WebSocketProvider(self.ws_url, max_connection_retries=1)) as w3:
+            heads_subscription = await w3.eth.subscribe("newHeads")
+            self.connected = True
+            self._reconnect_delay = RECONNECT_DELAY
+            logger.info(f"Подписка newHeads через WebSocket активна: {self.ws_url}")
+
+            async for payload in w3.socket.process_subscriptions():
+                if self._stop.is_set():
+                    return
+                if payload["subscription"] != heads_subscription:
+                    continue
+                result = payload["result"]
+                base_fee = result.get("baseFeePerGas")
+                self._on_block(_to_int(result["number"]), None if base_fee is None else _to_int(base_fee))
+
+
+def _to_int(value) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
@@ -0,0 +1,253 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from web3 import Web3
+from web3.middleware import Web3Middleware
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+BLOCK_TTL = 0.25  # Arbitrum выпускает блок примерно раз в 250 мс
+CALL_CACHE_SIZE = 4096
+
+# Функции, результат которых не меняется за время жизни контракта: кэшируются без привязки к блоку
+IMMUTABLE_FUNCTIONS = (
+    "decimals()",
+    "symbol()",
+    "name()",
+    "coins(uint256)",
+    "asset()",
+    "gauge()",
+    "token()",
+)
+# Методы JSON-RPC, ответ которых не меняется: web3 проверяет eth_chainId перед каждым eth_call и eth_estimateGas
+IMMUTABLE_METHODS = ("eth_chainId",)
+
+_MISSING = object()
+
+
+class BlockCache:
+    """Общий для всех кошельков кэш чтений, действительный в пределах одного блока"""
+
+    def __init__(self, web3: Web3, block_ttl: float = BLOCK_TTL):
+        self.web3 = web3
+        self.block_ttl = block_ttl
+        self._block_number: int | None = None
+        self._block_seen_at = 0.0
+        self._values: dict = {}
+        self._key_locks: dict[object, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._follows_clock = False
+
+    def follow(self, block_clock) -> None:
+        """Берёт номер блока из BlockClock вместо опроса ноды по таймеру"""
+        block_clock.add_block_listener(self.on_new_block)
+        self._follows_clock = True
+
+    def block_number(self) -> int:
+        """Текущий блок; без BlockClock запрашивается у ноды не чаще раза в block_ttl секунд"""
+        with self._lock:
+            expired = not self._follows_clock and time.monotonic() - self._block_seen_at >= self.block_ttl
+            if self._block_number is None or expired:
+                self._set_block(self.web3.eth.block_number)
+            return self._block_number
+
+    def on_new_block(self, block_number: int) -> None:
+        """Сообщает кэшу о новом блоке и сбрасывает устаревшие значения"""
+        with self._lock:
+            self._set_block(block_number)
+
+    def _set_block(self, block_number: int) -> None:
+        if self._block_number is not None and block_number < self._block_number:
+            return
+        if block_number != self._block_number:
+            self._values.clear()
+            self._key_locks.clear()
+        self._block_number = block_number
+        self._block_seen_at = time.monotonic()
+
+    def get_or_fetch(self, key, fetch):
+        """Возвращает значение для ключа в текущем блоке, вызывая fetch() только один раз"""
+        block = self.block_number()
+        with self._lock:
+            value = self._values.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Остальные кошельки ждут первый запрос вместо того, чтобы дублировать его
+        with key_lock:
+            with self._lock:
+                value = self._values.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            value = fetch()
+            with self._lock:
+                if self._block_number == block:
+                    self._values[key] = value
+            return value
+
+
+class CallCache:
+    """LRU-кэш результатов eth_call с ключом (блок, адрес, calldata)"""
+
+    def __init__(
+        self,
+        block_cache: BlockCache,
+        max_entries: int = CALL_CACHE_SIZE,
+        immutable_functions=IMMUTABLE_FUNCTIONS,
+    ):
+        self.block_cache = block_cache
+        self.max_entries = max_entries
+        self.immutable_selectors = {_selector(signature) for signature in immutable_functions}
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._immutable: dict = {}
+        self._block_number: int | None = None
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "immutable_entries": len(self._immutable),
+            }
+
+    def invalidate(self) -> None:
+        """Сбрасывает все изменяемые значения, например после подтверждения нашей транзакции"""
+        with self._lock:
+            self._entries.clear()
+
+    def on_transaction_confirmed(self, block_number: int) -> None:
+        """Наша транзакция изменила состояние: сдвигаем часы на её блок и забываем прочитанное"""
+        if block_number > self.block_cache.block_number():
+            self.block_cache.on_new_block(block_number)
+        self.invalidate()
+
+    def _key(self, params):
+        tx, block_identifier = params[0], params[1] if len(params) > 1 else "latest"
+        to = str(tx.get("to", "")).lower()
+        data = str(tx.get("data", tx.get("input", ""))).lower()
+        if data[2:10] in self.immutable_selectors:
+            return None, (to, data)
+
+        # Явно указанный номер или хэш блока сам по себе неизменяем и годится в ключ
+        block = (
+            self.block_cache.block_number() if block_identifier in ("latest", "safe", "finalized") else block_identifier
+        )
+        return block, (block, to, data, str(tx.get("from", "")).lower(), str(tx.get("value", "")))
+
+    def get(self, params):
+        block, key = self._key(params)
+        with self._lock:
+            if block is None:
+                response = self._immutable.get(key)
+            else:
+                if block != self._block_number:
+                    # Новый блок: значения прошлых блоков больше не понадобятся
+                    self._entries.clear()
+                    self._block_number = block
+                response = self._entries.get(key)
+                if response is not None:
+                    self._entries.move_to_end(key)
+
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return key, block, response
+
+    def get_method(self, method: str):
+        """Ответ неизменяемого метода JSON-RPC без параметров"""
+        key = (method,)
+        with self._lock:
+            response = self._immutable.get(key)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return key, None, response
+
+    def put(self, key, block, response) -> None:
+        if "error" in response:
+            return
+        with self._lock:
+            if block is None:
+                self._immutable[key] = response
+                return
+            if block != self._block_number:
+                return
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class CallCacheMiddleware(Web3Middleware):
+    """Middleware web3, отвечающее на повторные eth_call из CallCache"""
+
+    call_cache: CallCache
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            if method == "eth_getTransactionReceipt":
+                # Квитанции запрашиваются только для наших транзакций: их подтверждение меняет состояние
+                response = make_request(method, params)
+                receipt = response.get("result")
+                if receipt:
+                    self.call_cache.on_transaction_confirmed(_to_int(receipt["blockNumber"]))
+                return response
+
+            if method in IMMUTABLE_METHODS:
+                key, block, response = self.call_cache.get_method(method)
+                if response is None:
+                    response = make_request(method, params)
+                    self.call_cache.put(key, block, response)
+                return response
+
+            if method != "eth_call" or (len(params) > 1 and params[1] == "pending"):
+                return make_request(method, params)
+
+            key, block, response = self.call_cache.get(params)
+            if response is not None:
+                return response
+
+            response = make_request(method, params)
+            self.call_cache.put(key, block, response)
+            return response
+
+        return middleware
+
+
+def install_call_cache(web3: Web3, block_cache: BlockCache, max_entries: int = CALL_CACHE_SIZE) -> CallCache:
+    """Подключает кэш eth_call к провайдеру web3 и возвращает его для статистики и сброса"""
+    call_cache = CallCache(block_cache, max_entries)
+
+    def build(w3):
+        middleware = CallCacheMiddleware(w3)
+        middleware.call_cache = call_cache
+        return middleware
+
+    web3.middleware_onion.add(build, "call_cache")
+    return call_cache
+
+
+def _selector(signature: str) -> str:
+    return Web3.keccak(text=signature)[:4].hex().removeprefix("0x")
+
+
+def _to_int(value) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
@@ -1,6 +1,10 @@
+import argparse
 import logging
+from contextlib import nullcontext
+from functools import partial
 
 from web3 import Web3
+from web3.exceptions import TransactionNotFound
 
 import abis
 from addresses import (
@@ -11,11 +15,27 @@ from addresses import (
     GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS,
     ONEINCH_ROUTER_ADDRESS,
 )
-from config import ARBITRUM_RPC, PRIVATE_KEY, WALLET_ADDRESS
+from block_clock import BlockClock
+from cache import BlockCache, install_call_cache
+from config import ARBITRUM_RPC, PRIVATE_KEY, PROFILE_MODE
 from curve import build_add_liquidity_tx
-from oneinch import build_swap_tx, get_quote
-from stake_dao import build_claim_tx, build_deposit_tx
-from utils import GasTracker, approve, send_tx
+from gas_cost import estimate_gas_components, fit_fees
+from gas_model import GasLimitModel, install_gas_model
+from journal import CONFIRMED, FAILED, PENDING, Journal
+from notifications import TelegramNotifier
+from oneinch import build_swap_tx, get_swap
+from profiling import PROFILE_MODES, CycleProfiler
+from rewards import (
+    estimate_swap_costs,
+    get_reward_tokens,
+    plan_swaps,
+    quote_in_eth,
+    read_balances_and_allowances,
+    read_positions,
+)
+from stake_dao import build_claim_tx, build_deposit_tx, build_vault_claim_tx
+from utils import GasTracker, get_gas_fees, tx_params
+from wallet import Wallet
 
 
 logging.basicConfig(
@@ -26,103 +46,327 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main():
-    # Инициализация Web3
-    web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
-    assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
-
-    gas_tracker = GasTracker(web3)
-
-    # Собираем награды в StakeDAO
-    claim_tx = build_claim_tx(
-        web3=web3,
-        wallet_address=WALLET_ADDRESS,
-        gauges_addresses=[
-            GMAC_CRVUSD_ETH_GAUGE_ADDRESS,
-        ],
-    )
+class CompoundCycle:
+    """Цикл компаундинга как конечный автомат: каждый шаг отправляет не более одной транзакции
+    и сохраняет её хэш и результаты в журнал, чтобы после падения продолжить с последнего шага"""
 
-    claim_tx_hash = send_tx(web3, claim_tx, PRIVATE_KEY)
-    gas_tracker.add_transaction("Сбор наград StakeDAO", claim_tx_hash)
-
-    # Меняем весь собранный CRV на crvUSD
-    crv_contract = web3.eth.contract(address=Web3.to_checksum_address(CRV_ADDRESS), abi=abis.ERC20)
-    crv_balance = crv_contract.functions.balanceOf(WALLET_ADDRESS).call()
-    logger.info(f"CRV balance: {Web3.from_wei(crv_balance, 'ether'):.4f}")
-
-    quote = get_quote(CRV_ADDRESS, CRVUSD_ADDRESS, crv_balance)
-    logger.info(f"Получим примерно: {int(quote['dstAmount']) / 10**18} crvUSD")
-
-    approve(
-        web3=web3,
-        wallet_address=WALLET_ADDRESS,
-        token_address=CRV_ADDRESS,
-        spender=ONEINCH_ROUTER_ADDRESS,
-        balance=crv_balance,
-        private_key=PRIVATE_KEY,
-        gas_tracker=gas_tracker,
+    STEPS = (
+        "claim",
+        "plan",
+        "claim_extra",
+        "swap_approve",
+        "swap",
+        "add_liquidity_approve",
+        "add_liquidity",
+        "deposit_approve",
+        "deposit",
     )
 
-    swap_tx = build_swap_tx(
-        wallet_address=WALLET_ADDRESS,
-        from_token=CRV_ADDRESS,
-        to_token=CRVUSD_ADDRESS,
-        amount=crv_balance,
-    )
+    def __init__(
+        self,
+        web3: Web3,
+        wallet: Wallet,
+        gas_tracker: GasTracker,
+        reads: BlockCache,
+        journal: Journal | None = None,
+    ):
+        self.web3 = web3
+        self.wallet = wallet
+        self.gas_tracker = gas_tracker
+        self.reads = reads
+        self.journal = journal if journal is not None else Journal.for_wallet(wallet.address)
 
-    swap_tx_hash = send_tx(web3, swap_tx, PRIVATE_KEY)
-    gas_tracker.add_transaction("Обмен CRV на crvUSD 1inch", swap_tx_hash)
-
-    # Добавляем весь crvUSD в пул GMAC/crvUSD/ETH
-    crvUSD_contract = web3.eth.contract(address=CRVUSD_ADDRESS, abi=abis.ERC20)
-    crvUSD_balance = crvUSD_contract.functions.balanceOf(WALLET_ADDRESS).call()
-    logger.info(f"crvUSD balance: {Web3.from_wei(crvUSD_balance, 'ether'):.4f}")
-
-    approve(
-        web3=web3,
-        wallet_address=WALLET_ADDRESS,
-        token_address=CRVUSD_ADDRESS,
-        spender=GMAC_CRVUSD_ETH_POOL_ADDRESS,
-        balance=crvUSD_balance,
-        private_key=PRIVATE_KEY,
-        gas_tracker=gas_tracker,
-    )
+    def run(self, profiler: CycleProfiler | None = None) -> None:
+        for step in self.STEPS:
+            with profiler.stage(step) if profiler is not None else nullcontext():
+                self._run_step(step, getattr(self, f"_{step}"))
 
-    # Совершаем добавление ликвидности
-    add_liquidity_tx = build_add_liquidity_tx(
-        web3=web3,
-        wallet_address=WALLET_ADDRESS,
-        pool_address=GMAC_CRVUSD_ETH_POOL_ADDRESS,
-        amounts=[crvUSD_balance, 0, 0],  # [crvUSD, ETH, GMAC]
-    )
+        self.journal.clear()
 
-    add_liquidity_tx_hash = send_tx(web3, add_liquidity_tx, PRIVATE_KEY)
-    gas_tracker.add_transaction("Добавление ликвидности Curve", add_liquidity_tx_hash)
-
-    # Добавляем полученные LP токены в Vault StakeDAO
-    lp_token_contract = web3.eth.contract(address=GMAC_CRVUSD_ETH_POOL_ADDRESS, abi=abis.ERC20)
-    lp_token_balance = lp_token_contract.functions.balanceOf(WALLET_ADDRESS).call()
-    logger.info(f"TriGemach balance: {Web3.from_wei(lp_token_balance, 'ether'):.4f}")
-
-    approve(
-        web3=web3,
-        wallet_address=WALLET_ADDRESS,
-        token_address=GMAC_CRVUSD_ETH_POOL_ADDRESS,
-        spender=GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS,
-        balance=lp_token_balance,
-        private_key=PRIVATE_KEY,
-        gas_tracker=gas_tracker,
-    )
+    def _run_step(self, step: str, action) -> None:
+        """Выполняет шаг, если по журналу он не завершён в прошлом запуске"""
+        if self.journal.is_confirmed(step):
+            logger.info(f"Шаг {step} уже выполнен в прошлом запуске, пропускаем")
+            return
+        record = self.journal.get(step)
+        if record is not None and record["status"] == PENDING and self._reconcile(step, record["tx_hash"]):
+            return
+
+        try:
+            action()
+        except Exception:
+            # Nonce выдаётся до сборки транзакции: если сборка или отправка упала, он остался неиспользованным,
+            # и следующая транзакция кошелька ушла бы с пропуском. Перечитаем nonce из сети
+            self.wallet.reset_nonce()
+            raise
+
+    def _fees(self):
+        # Комиссии одинаковы для всех кошельков в пределах блока; с подпиской newHeads baseFee приходит без запроса
+        block_clock = self.gas_tracker.block_clock
+        fetch = block_clock.gas_fees if block_clock is not None else lambda: get_gas_fees(self.web3)
+        return self.reads.get_or_fetch("gas_fees", fetch)
+
+    def _tx_overrides(self) -> dict:
+        """Nonce из локального счётчика кошелька и комиссии блока: сборка транзакции не ходит за ними к ноде"""
+        return {"nonce": self.wallet.next_nonce(self.web3), **self._fees()}
+
+    def _on_signed(self, step: str, **outputs):
+        # Результаты пишем вместе с хэшем: при сверке после перезапуска они понадобятся следующим шагам
+        def on_signed(tx_hash):
+            self.journal.record(step, status=PENDING, tx_hash=tx_hash, **outputs)
+
+        return on_signed
+
+    def _confirm(self, step: str, receipt, **outputs) -> None:
+        """Записывает результат шага; отменённая транзакция останавливает цикл"""
+        tx_hash = self.web3.to_hex(receipt["transactionHash"]) if receipt is not None else None
+        if receipt is not None and receipt["status"] != 1:
+            self.journal.record(step, status=FAILED, tx_hash=tx_hash)
+            raise RuntimeError(f"Транзакция шага {step} отменена: {tx_hash}")
+
+        self.journal.record(step, status=CONFIRMED, tx_hash=tx_hash, **outputs)
+
+    def _reconcile(self, step: str, tx_hash: str) -> bool:
+        """Сверяет транзакцию из журнала с сетью вместо повторной сборки; True — шаг завершён"""
+        try:
+            self.web3.eth.get_transaction(tx_hash)
+        except TransactionNotFound:
+            logger.warning(f"Транзакция {tx_hash} шага {step} не найдена в сети, шаг будет выполнен заново")
+            return False
+
+        logger.info(f"Дожидаемся транзакции {tx_hash} шага {step} из прошлого запуска")
+        receipt = self.gas_tracker.add_transaction(step, tx_hash)
+        if receipt["status"] != 1:
+            logger.warning(f"Транзакция {tx_hash} шага {step} отменена, шаг будет выполнен заново")
+            self.journal.record(step, status=FAILED)
+            return False
+
+        self.journal.record(step, status=CONFIRMED)
+        return True
+
+    def _balance(self, token_address) -> int:
+        contract = self.web3.eth.contract(address=token_address, abi=abis.ERC20)
+        return contract.functions.balanceOf(self.wallet.address).call()
+
+    def _symbol(self, token_address) -> str:
+        # symbol() неизменяем и после первого чтения берётся из кэша eth_call
+        return self.web3.eth.contract(address=token_address, abi=abis.ERC20).functions.symbol().call()
+
+    def _approve(self, step: str, token_address, spender, symbol: str, balance: int | None = None) -> None:
+        """Шаг разрешения: фиксирует баланс токена, который потратит следующий шаг"""
+        if balance is None:
+            balance = self._balance(token_address)
+        logger.info(f"{symbol} balance: {Web3.from_wei(balance, 'ether'):.4f}")
+
+        receipt = None
+        if not self.wallet.reserve_allowance(self.web3, token_address, spender, balance):
+            # Как build_approve_tx, но с nonce и комиссиями цикла
+            token = self.web3.eth.contract(address=Web3.to_checksum_address(token_address), abi=abis.ERC20)
+            approve_tx = token.functions.approve(Web3.to_checksum_address(spender), balance).build_transaction(
+                tx_params(self.web3, self.wallet.address, self._tx_overrides())
+            )
+            receipt = self._send(step, approve_tx, "Разрешение токена", amount=balance)
+        self._confirm(step, receipt, amount=balance)
+
+    def _send(self, step: str, tx: dict, tx_name: str, **outputs):
+        return self.wallet.send(self.web3, tx, self.gas_tracker, tx_name, self._on_signed(step, **outputs))
+
+    def _approved_amount(self, step: str) -> int:
+        return self.journal.get(f"{step}_approve")["amount"]
+
+    def _claim(self) -> None:
+        # Собираем награды в StakeDAO
+        claim_tx = build_claim_tx(
+            web3=self.web3,
+            wallet_address=self.wallet.address,
+            gauges_addresses=[
+                GMAC_CRVUSD_ETH_GAUGE_ADDRESS,
+            ],
+            tx_overrides=self._tx_overrides(),
+        )
+
+        receipt = self._send("claim", claim_tx, "Сбор наград StakeDAO")
+        self._confirm("claim", receipt)
+
+    def _plan(self) -> None:
+        # Кроме CRV хранилище может платить дополнительными токенами: обмениваем все, что выгодно обменять.
+        # Решение принимается здесь, до разрешений роутеру, чтобы не платить за approve невыгодного обмена
+        vault = GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS
+        reward_tokens = self.reads.get_or_fetch(("reward_tokens", vault), lambda: get_reward_tokens(self.web3, vault))
+        tokens = list(dict.fromkeys([CRV_ADDRESS, CRVUSD_ADDRESS, *reward_tokens]))
+        positions = read_positions(self.web3, self.wallet.address, vault, tokens, reward_tokens)
 
-    deposit_tx = build_deposit_tx(
-        web3=web3,
-        wallet_address=WALLET_ADDRESS,
-        vault_address=GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS,
-        amount=lp_token_balance,
+        candidates = [p for p in positions if p.amount and p.token != CRVUSD_ADDRESS]
+        values = quote_in_eth(candidates, self.reads)
+        costs = estimate_swap_costs(
+            self.web3, self.wallet.address, candidates, CRVUSD_ADDRESS, self.gas_tracker.gas_model
+        )
+        plan = plan_swaps(candidates, values, costs)
+        claim_tokens = [p.token for p in plan if p.claimable]
+        if claim_tokens:
+            # crvUSD обменивать не нужно, но раз транзакция сбора всё равно отправляется, забираем и его
+            claim_tokens += [p.token for p in positions if p.token == CRVUSD_ADDRESS and p.claimable]
+
+        logger.info(f"План обмена наград: {[p.token for p in plan]}, сбор из хранилища: {claim_tokens}")
+        self._confirm("plan", None, tokens=[p.token for p in plan], claim_tokens=claim_tokens)
+
+    def _claim_extra(self) -> None:
+        claim_tokens = self.journal.get("plan")["claim_tokens"]
+        if not claim_tokens:
+            self._confirm("claim_extra", None)
+            return
+
+        claim_tx = build_vault_claim_tx(
+            web3=self.web3,
+            wallet_address=self.wallet.address,
+            vault_address=GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS,
+            tokens=claim_tokens,
+            tx_overrides=self._tx_overrides(),
+        )
+
+        receipt = self._send("claim_extra", claim_tx, "Сбор дополнительных наград StakeDAO")
+        self._confirm("claim_extra", receipt)
+
+    def _swap_approve(self) -> None:
+        # Балансы и текущие разрешения роутеру для всех токенов плана читаем одним пакетом
+        tokens = self.journal.get("plan")["tokens"]
+        positions = read_balances_and_allowances(self.web3, self.wallet.address, tokens, ONEINCH_ROUTER_ADDRESS)
+        for token, (balance, allowance) in positions.items():
+            self.wallet.allowances[(token, ONEINCH_ROUTER_ADDRESS)] = allowance
+            step = f"swap_approve:{token}"
+            self._run_step(
+                step, partial(self._approve, step, token, ONEINCH_ROUTER_ADDRESS, self._symbol(token), balance)
+            )
+
+        self._confirm("swap_approve", None)
+
+    def _swap(self) -> None:
+        for token in self.journal.get("plan")["tokens"]:
+            self._run_step(f"swap:{token}", partial(self._swap_token, token))
+
+        self._confirm("swap", None)
+
+    def _swap_token(self, token) -> None:
+        # Меняем всю собранную награду в токене на crvUSD
+        step = f"swap:{token}"
+        amount = self.journal.get(f"swap_approve:{token}")["amount"]
+        if not amount:
+            self._confirm(step, None, amount=0)
+            return
+
+        symbol = self._symbol(token)
+        swap = get_swap(self.wallet.address, token, CRVUSD_ADDRESS, amount)
+        logger.info(f"Получим примерно: {int(swap['dstAmount']) / 10**18} crvUSD за {symbol}")
+        swap_tx = build_swap_tx(self.web3, swap, self._tx_overrides())
+
+        # Выгодность обмена уже решена в _plan; здесь только лимит газа и комиссии с учётом L1-части calldata 1inch
+        estimate = estimate_gas_components(self.web3, swap_tx)
+        if estimate is not None:
+            fit_fees(swap_tx, estimate)
+
+        receipt = self._send(step, swap_tx, f"Обмен {symbol} на crvUSD 1inch", amount=amount)
+        self._confirm(step, receipt, amount=amount)
+
+    def _add_liquidity_approve(self) -> None:
+        self._approve("add_liquidity_approve", CRVUSD_ADDRESS, GMAC_CRVUSD_ETH_POOL_ADDRESS, "crvUSD")
+
+    def _add_liquidity(self) -> None:
+        # Добавляем весь crvUSD в пул GMAC/crvUSD/ETH
+        crvUSD_balance = self._approved_amount("add_liquidity")
+        if not crvUSD_balance:
+            self._confirm("add_liquidity", None, amount=0)
+            return
+
+        add_liquidity_tx = build_add_liquidity_tx(
+            web3=self.web3,
+            wallet_address=self.wallet.address,
+            pool_address=GMAC_CRVUSD_ETH_POOL_ADDRESS,
+            amounts=[crvUSD_balance, 0, 0],  # [crvUSD, ETH, GMAC]
+            options=self._tx_overrides(),
+        )
+
+        receipt = self._send("add_liquidity", add_liquidity_tx, "Добавление ликвидности Curve", amount=crvUSD_balance)
+        self._confirm("add_liquidity", receipt, amount=crvUSD_balance)
+
+    def _deposit_approve(self) -> None:
+        self._approve(
+            "deposit_approve", GMAC_CRVUSD_ETH_POOL_ADDRESS, GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS, "TriGemach"
+        )
+
+    def _deposit(self) -> None:
+        # Добавляем полученные LP токены в Vault StakeDAO
+        lp_token_balance = self._approved_amount("deposit")
+        if not lp_token_balance:
+            self._confirm("deposit", None, amount=0)
+            return
+
+        deposit_tx = build_deposit_tx(
+            web3=self.web3,
+            wallet_address=self.wallet.address,
+            vault_address=GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS,
+            amount=lp_token_balance,
+            tx_overrides=self._tx_overrides(),
+        )
+
+        receipt = self._send("deposit", deposit_tx, "Депозит LP токена в StakeDAO Vault", amount=lp_token_balance)
+        self._confirm("deposit", receipt, amount=lp_token_balance)
+
+
+def compound(
+    web3: Web3,
+    wallet: Wallet,
+    gas_tracker: GasTracker,
+    reads: BlockCache,
+    profiler: CycleProfiler | None = None,
+) -> None:
+    """Один цикл компаундинга для одного кошелька, продолжающий незавершённый цикл из журнала.
+    В notifier трекера газа уходит одна итоговая строка на кошелёк, а не строка на каждую транзакцию"""
+    CompoundCycle(web3, wallet, gas_tracker, reads).run(profiler)
+    if gas_tracker.notifier is not None:
+        _, total_cost_eth = gas_tracker.get_total_cost()
+        gas_tracker.notifier.notify(
+            f"{wallet.address}: транзакций {len(gas_tracker.transactions)}, газ {total_cost_eth:.6f} ETH"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Цикл компаундинга наград StakeDAO")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="sample",
+        default=PROFILE_MODE or None,
+        choices=PROFILE_MODES,
+        help="записать профиль цикла по этапам (по умолчанию из PROFILE_MODE)",
     )
+    args = parser.parse_args()
+
+    profiler = CycleProfiler(args.profile).start() if args.profile else None
+    with profiler.stage("setup") if profiler is not None else nullcontext():
+        # Инициализация Web3
+        web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
+        assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
 
-    send_tx_hash = send_tx(web3, deposit_tx, PRIVATE_KEY)
-    gas_tracker.add_transaction("Депозит LP токена в StakeDAO Vault", send_tx_hash)
+        block_clock = BlockClock(web3).start()
+        reads = BlockCache(web3)
+        reads.follow(block_clock)
+        call_cache = install_call_cache(web3, reads)
+        gas_model = install_gas_model(web3, GasLimitModel())
+        notifier = TelegramNotifier()
+        gas_tracker = GasTracker(web3, notifier, gas_model, block_clock)
+    try:
+        compound(web3, Wallet(PRIVATE_KEY), gas_tracker, reads, profiler)
+    except Exception as e:
+        notifier.notify(f"Ошибка цикла компаундинга: {e}")
+        raise
+    finally:
+        logger.info(f"Кэш eth_call: {call_cache.stats()}")
+        logger.info(f"Лимиты газа: {gas_model.predicted} из модели, {gas_model.estimated} через eth_estimateGas")
+        if profiler is not None:
+            logger.info(f"Профиль цикла сохранён: {profiler.stop()}")
+        notifier.flush("Curve Compounder")
+        notifier.close()
+        block_clock.stop()
 
 
 if __name__ == "__main__":
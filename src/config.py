@@ -1,4 +1,5 @@
 import os
+from decimal import Decimal
 
 from dotenv import load_dotenv
 from web3 import Web3
@@ -7,11 +8,27 @@ from web3 import Web3
 load_dotenv()
 
 ARBITRUM_RPC = os.getenv("ARBITRUM_RPC", "https://arb1.arbitrum.io/rpc")
+ARBITRUM_WS_RPC = os.getenv("ARBITRUM_WS_RPC", "")  # Необязательно: wss://... для подписки на новые блоки
 ARBITRUM_CHAIN_ID = 42161
 PRIVATE_KEY = os.getenv("PRIVATE_KEY", "")  # Никогда не храните в коде!
-WALLET_ADDRESS = Web3.to_checksum_address(os.getenv("WALLET_ADDRESS", ""))
+WALLET_ADDRESS = Web3.to_checksum_address(os.getenv("WALLET_ADDRESS")) if os.getenv("WALLET_ADDRESS") else ""
+# Ключи нескольких кошельков через запятую; по умолчанию используется только PRIVATE_KEY
+PRIVATE_KEYS = [key.strip() for key in os.getenv("PRIVATE_KEYS", PRIVATE_KEY).split(",") if key.strip()]
+MAX_PARALLEL_WALLETS = int(os.getenv("MAX_PARALLEL_WALLETS", "4"))
+DATA_DIR = os.getenv("DATA_DIR", "data")  # Журналы и другие файлы состояния бота
+# Минимальная выгода цикла: ожидаемая стоимость наград за вычетом газа (L1 + L2)
+MIN_PROFIT_ETH = Decimal(os.getenv("MIN_PROFIT_ETH", "0"))
+GAS_LIMIT_MARGIN = float(os.getenv("GAS_LIMIT_MARGIN", "0.3"))  # Запас к выученному лимиту газа
+# Профилирование цикла: "" — выключено, "sample" или "deterministic"; профили хранятся в DATA_DIR/profiles
+PROFILE_MODE = os.getenv("PROFILE_MODE", "")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))  # Сколько последних профилей хранить
+PROFILE_LABEL = os.getenv("PROFILE_LABEL", "")  # Например, версия образа, чтобы сравнивать профили релизов
 WEEK = 7 * 24 * 60 * 60  # 7 days in seconds
 POLL_INTERVAL = 60 * 60  # Check every hour
 
 ONEINCH_API_URL = f"https://api.1inch.com/swap/v6.1/{ARBITRUM_CHAIN_ID}"
 ONEINCH_API_KEY = os.getenv("ONEINCH_API_KEY", "")
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
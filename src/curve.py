@@ -4,8 +4,9 @@ from web3 import Web3
 
 import abis
 from addresses import CRVUSD_ADDRESS, GMAC_CRVUSD_ETH_POOL_ADDRESS
+from block_clock import BlockClock
 from config import ARBITRUM_RPC, PRIVATE_KEY, WALLET_ADDRESS
-from utils import build_approve_tx, get_allowance, get_gas_fees, send_tx
+from utils import build_approve_tx, get_allowance, send_tx, tx_params
 
 
 logging.basicConfig(
@@ -15,13 +16,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEFAULT_SLIPPAGE = 0.1  # %
 
-# Инициализация Web3
-web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
-assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
 
-
-def build_add_liquidity_tx(web3: Web3, wallet_address, pool_address, amounts, slippage=0.1):
+def build_add_liquidity_tx(web3: Web3, wallet_address, pool_address, amounts, options=None):
+    """options: slippage в процентах и поля транзакции, например nonce и комиссии"""
+    options = dict(options or {})
+    slippage = options.pop("slippage", DEFAULT_SLIPPAGE)
     contract = web3.eth.contract(
         address=Web3.to_checksum_address(pool_address),
         abi=abis.CURVE_TRICRYPTO_POOL,
@@ -33,18 +34,17 @@ def build_add_liquidity_tx(web3: Web3, wallet_address, pool_address, amounts, sl
         amounts,
         int(min_mint_amount * (1 - slippage / 100)),
         True,
-    ).build_transaction(
-        {
-            "from": wallet_address,
-            "nonce": web3.eth.get_transaction_count(wallet_address),
-            **get_gas_fees(web3),
-        }
-    )
+    ).build_transaction(tx_params(web3, wallet_address, options))
 
     return tx
 
 
 if __name__ == "__main__":
+    # Инициализация Web3
+    web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
+    assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
+    block_clock = BlockClock(web3).start()
+
     amount = int(float(input("Введите количество crvUSD для добавления в пул: ")) * 10**18)
 
     # Проверяем баланс
@@ -74,7 +74,7 @@ if __name__ == "__main__":
         tx_hash = send_tx(web3, approve_tx, PRIVATE_KEY)
         logger.info(f"Транзакция разрешения: {tx_hash}")
 
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = block_clock.wait_for_receipt(tx_hash)
         logger.info(f"Разрешение добавлено: {receipt}")
 
     # Совершаем добавление ликвидности
@@ -0,0 +1,95 @@
+import logging
+import math
+from typing import NamedTuple
+
+from web3 import Web3
+
+import abis
+from addresses import ARBITRUM_NODE_INTERFACE_ADDRESS
+from config import GAS_LIMIT_MARGIN
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+L1_GAS_UNITS_PER_BYTE = 16  # Единиц L1-газа на байт данных транзакции
+L1_OVERHEAD_BYTES = 140  # Постоянная добавка ArbOS к размеру транзакции в пакете L1
+
+
+class GasEstimate(NamedTuple):
+    """Оценка газа Arbitrum: L1-часть (публикация calldata) выражена в единицах L2-газа по baseFee"""
+
+    gas: int  # Общий лимит, включая L1-часть
+    gas_for_l1: int
+    base_fee: int
+    l1_base_fee: int
+
+
+def estimate_gas_components(web3: Web3, tx: dict) -> GasEstimate | None:
+    """Разбивка газа транзакции через прекомпиль NodeInterface.gasEstimateComponents;
+    None, если нода его не поддерживает"""
+    node_interface = web3.eth.contract(address=ARBITRUM_NODE_INTERFACE_ADDRESS, abi=abis.ARBITRUM_NODE_INTERFACE)
+    try:
+        gas, gas_for_l1, base_fee, l1_base_fee = node_interface.functions.gasEstimateComponents(
+            Web3.to_checksum_address(tx["to"]),
+            False,
+            Web3.to_bytes(hexstr=tx["data"]) if isinstance(tx["data"], str) else tx["data"],
+        ).call({"from": tx["from"], "value": int(tx.get("value", 0))})
+    except Exception as e:
+        logger.warning(f"Не удалось получить разбивку газа L1/L2: {e}")
+        return None
+
+    return GasEstimate(gas, gas_for_l1, base_fee, l1_base_fee)
+
+
+def l1_gas_call(web3: Web3, to, data):
+    """Вызов NodeInterface.gasEstimateL1Component: (gasEstimateForL1, baseFee, l1BaseFeeEstimate).
+    Транзакция при этом не выполняется, поэтому оценке не нужны ни разрешения, ни балансы;
+    годится и для .call(), и для пакетного запроса"""
+    node_interface = web3.eth.contract(address=ARBITRUM_NODE_INTERFACE_ADDRESS, abi=abis.ARBITRUM_NODE_INTERFACE)
+    return node_interface.functions.gasEstimateL1Component(
+        Web3.to_checksum_address(to),
+        False,
+        Web3.to_bytes(hexstr=data) if isinstance(data, str) else data,
+    )
+
+
+def l1_gas_per_byte(web3: Web3) -> float | None:
+    """Цена байта calldata в единицах L2-газа: 16 единиц L1 на байт по l1BaseFeeEstimate, делённые на baseFee.
+    Одна цена годится для любых транзакций; None, если нода не поддерживает NodeInterface"""
+    try:
+        _, base_fee, l1_base_fee = l1_gas_call(web3, ARBITRUM_NODE_INTERFACE_ADDRESS, b"").call()
+    except Exception as e:
+        logger.warning(f"Не удалось получить цену L1-данных: {e}")
+        return None
+    return L1_GAS_UNITS_PER_BYTE * l1_base_fee / base_fee if base_fee else None
+
+
+def l1_gas_for_data(data, gas_per_byte: float) -> int:
+    """L1-часть газа по длине calldata без сжатия, то есть с запасом, плюс постоянная добавка ArbOS"""
+    size = len(Web3.to_bytes(hexstr=data)) if isinstance(data, str) else len(data)
+    return math.ceil((size + L1_OVERHEAD_BYTES) * gas_per_byte)
+
+
+def receipt_gas_for_l1(receipt) -> int:
+    """Поле gasUsedForL1 квитанции Arbitrum; 0, если нода его не возвращает"""
+    gas_used_for_l1 = receipt.get("gasUsedForL1", 0)
+    return int(gas_used_for_l1, 16) if isinstance(gas_used_for_l1, str) else gas_used_for_l1
+
+
+def split_receipt_cost(receipt, gas_price: int) -> tuple[int, int]:
+    """Фактическая стоимость (L2, L1) в wei по полю gasUsedForL1 квитанции Arbitrum"""
+    gas_used_for_l1 = receipt_gas_for_l1(receipt)
+    return (receipt["gasUsed"] - gas_used_for_l1) * gas_price, gas_used_for_l1 * gas_price
+
+
+def fit_fees(tx: dict, estimate: GasEstimate, margin: float = GAS_LIMIT_MARGIN) -> dict:
+    """Подгоняет лимит газа и maxFeePerGas под оценку: лимит должен покрывать и L1-часть,
+    а maxFeePerGas — свежий baseFee, иначе транзакция с длинным calldata не пройдёт"""
+    tx["gas"] = max(int(tx.get("gas", 0)), int(estimate.gas * (1 + margin)))
+    tx["maxFeePerGas"] = max(tx["maxFeePerGas"], estimate.base_fee + tx["maxPriorityFeePerGas"])
+    return tx
@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from web3 import Web3
+from web3.middleware import Web3Middleware
+
+from config import DATA_DIR, GAS_LIMIT_MARGIN
+from gas_cost import l1_gas_for_data, l1_gas_per_byte
+from utils import write_json_atomic
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+GAS_MODEL_PATH = os.path.join(DATA_DIR, "gas_model.json")
+MAX_SAMPLES = 20  # Сколько последних квитанций помнить для каждого действия
+SELECTOR_LENGTH = 10  # "0x" и 4 байта селектора функции
+# l1BaseFeeEstimate меняется по отчётам публикатора пакетов в L1, а не с каждым блоком L2
+L1_PRICE_TTL = 12.0  # с
+
+
+class GasLimitModel:
+    """Лимиты газа для известных действий (контракт, функция), выученные по прошлым квитанциям.
+    Учится только L2-часть: L1-часть на Arbitrum зависит от отношения цен газа L1 и L2
+    и к моменту следующей транзакции может вырасти больше любого запаса, поэтому считается заново
+    по длине calldata и общей для всех кошельков цене байта"""
+
+    def __init__(self, path: str | None = GAS_MODEL_PATH, margin: float = GAS_LIMIT_MARGIN):
+        self.path = path
+        self.margin = margin
+        self.l1_price_ttl = L1_PRICE_TTL
+        self.samples: dict[str, list[int]] = {}
+        self.predicted = 0
+        self.estimated = 0
+        self._lock = threading.Lock()
+        self._l1_price: float | None = None  # L2-газа на байт calldata
+        self._l1_price_at = 0.0
+        self._l1_lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.samples = json.load(f)
+
+    @staticmethod
+    def _key(to, data) -> str | None:
+        if not to or not data or len(data) < SELECTOR_LENGTH:
+            return None
+        return f"{Web3.to_checksum_address(to)}:{data[:SELECTOR_LENGTH].lower()}"
+
+    def l2_gas(self, to, data) -> int | None:
+        """Наибольший газ L2-исполнения действия по прошлым квитанциям, без запаса"""
+        key = self._key(to, data)
+        with self._lock:
+            samples = self.samples.get(key) if key is not None else None
+            return max(samples) if samples else None
+
+    def l1_gas(self, data, fetch_price) -> int | None:
+        """L1-часть газа по длине calldata; цену байта fetch_price() запрашиваем, только когда она устарела.
+        None, если цену получить не удалось"""
+        with self._l1_lock:
+            if self._l1_price is None or time.monotonic() - self._l1_price_at >= self.l1_price_ttl:
+                price = fetch_price()
+                if price is None:
+                    return None
+                self._l1_price, self._l1_price_at = price, time.monotonic()
+            price = self._l1_price
+        return l1_gas_for_data(data, price)
+
+    def predict(self, to, data, gas_for_l1: int) -> int | None:
+        """Лимит газа: запас на L2-часть плюс текущая L1-часть; None, если действие ещё не встречалось"""
+        l2_gas = self.l2_gas(to, data)
+        with self._lock:
+            if l2_gas is None:
+                self.estimated += 1
+                return None
+            self.predicted += 1
+        return int(l2_gas * (1 + self.margin)) + gas_for_l1
+
+    def record(self, to, data, l2_gas_used: int, success: bool) -> None:
+        """Учитывает L2-часть газа квитанции; после отмены действие снова оценивается через eth_estimateGas"""
+        key = self._key(to, data)
+        if key is None:
+            return
+
+        with self._lock:
+            if success:
+                self.samples[key] = [*self.samples.get(key, []), l2_gas_used][-MAX_SAMPLES:]
+            elif self.samples.pop(key, None) is not None:
+                logger.warning(f"Транзакция {key} отменена, лимит газа будет оценён заново")
+            if self.path is not None:
+                write_json_atomic(self.path, self.samples)
+
+
+class GasLimitMiddleware(Web3Middleware):
+    """Middleware web3, отвечающее на eth_estimateGas выученным лимитом L2-части и оценкой L1-части"""
+
+    gas_model: GasLimitModel
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            if method == "eth_estimateGas":
+                tx = params[0]
+                to, data = tx.get("to"), tx.get("data", tx.get("input"))
+                # L1-часть считаем сами по длине calldata: NodeInterface нужен, только когда цена байта устарела
+                known = self.gas_model.l2_gas(to, data) is not None
+                gas_for_l1 = self.gas_model.l1_gas(data, lambda: l1_gas_per_byte(self._w3)) if known else 0
+                gas_limit = self.gas_model.predict(to, data, gas_for_l1) if gas_for_l1 is not None else None
+                if gas_limit is not None:
+                    return {"jsonrpc": "2.0", "id": 0, "result": hex(gas_limit)}
+            return make_request(method, params)
+
+        return middleware
+
+
+def install_gas_model(web3: Web3, gas_model: GasLimitModel) -> GasLimitModel:
+    """Подключает модель к провайдеру web3: build_transaction перестаёт ходить в eth_estimateGas
+    для известных действий"""
+
+    def build(w3):
+        middleware = GasLimitMiddleware(w3)
+        middleware.gas_model = gas_model
+        return middleware
+
+    web3.middleware_onion.add(build, "gas_model")
+    return gas_model
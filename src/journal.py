@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+
+from config import DATA_DIR
+from utils import write_json_atomic
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.path.join(DATA_DIR, "journal")
+
+# Статусы шагов
+PENDING = "pending"  # транзакция подписана, квитанции ещё нет
+CONFIRMED = "confirmed"  # транзакция включена в блок, шаг завершён
+FAILED = "failed"  # транзакция отменена (revert), шаг нужно повторить
+
+
+class Journal:
+    """Журнал шагов цикла на диске, переживающий падение процесса"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.steps: dict[str, dict] = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self.steps = json.load(f)["steps"]
+            logger.info(f"Загружен журнал незавершённого цикла: {path}")
+
+    @classmethod
+    def for_wallet(cls, wallet_address: str, journal_dir: str | None = None) -> "Journal":
+        # JOURNAL_DIR читаем при вызове, чтобы simulation.py мог направить журналы во временный каталог
+        return cls(os.path.join(journal_dir or JOURNAL_DIR, f"{wallet_address}.json"))
+
+    def get(self, step: str) -> dict | None:
+        return self.steps.get(step)
+
+    def is_confirmed(self, step: str) -> bool:
+        record = self.steps.get(step)
+        return record is not None and record["status"] == CONFIRMED
+
+    def record(self, step: str, **fields) -> None:
+        """Обновляет запись шага и сразу сохраняет журнал на диск"""
+        self.steps[step] = {**self.steps.get(step, {}), **fields}
+        self._save()
+
+    def clear(self) -> None:
+        """Удаляет журнал после успешного завершения цикла"""
+        self.steps = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _save(self) -> None:
+        write_json_atomic(self.path, {"steps": self.steps})
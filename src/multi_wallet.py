@@ -0,0 +1,107 @@
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+
+from web3 import Web3
+
+from block_clock import BlockClock
+from cache import BlockCache, install_call_cache
+from compound_rewards import compound
+from config import ARBITRUM_RPC, MAX_PARALLEL_WALLETS, PRIVATE_KEYS
+from gas_model import GasLimitModel, install_gas_model
+from notifications import TelegramNotifier
+from profiling import CycleProfiler
+from utils import GasTracker
+from wallet import Wallet
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+
+def load_wallets(private_keys=PRIVATE_KEYS) -> list[Wallet]:
+    """Создаёт кошельки из списка приватных ключей, пропуская повторы"""
+    wallets: dict[str, Wallet] = {}
+    for private_key in private_keys:
+        wallet = Wallet(private_key)
+        wallets.setdefault(wallet.address, wallet)
+    return list(wallets.values())
+
+
+class RunContext(NamedTuple):
+    """Параметры прогона, общие для всех кошельков: размер пула потоков и профилировщик этапов"""
+
+    max_workers: int = MAX_PARALLEL_WALLETS
+    profiler: CycleProfiler | None = None
+
+
+def run_wallets(
+    web3: Web3,
+    wallets: list[Wallet],
+    gas_trackers: dict[str, GasTracker],
+    reads: BlockCache | None = None,
+    context: RunContext = RunContext(),
+) -> dict[str, Exception]:
+    """Параллельно выполняет цикл компаундинга для всех кошельков через общий провайдер и кэш;
+    возвращает ошибки по адресам кошельков, которые не завершили цикл"""
+    reads = reads if reads is not None else BlockCache(web3)
+    errors: dict[str, Exception] = {}
+
+    with ThreadPoolExecutor(max_workers=context.max_workers, thread_name_prefix="wallet") as executor:
+        futures = {
+            executor.submit(compound, web3, wallet, gas_trackers[wallet.address], reads, context.profiler): wallet
+            for wallet in wallets
+        }
+        for future in as_completed(futures):
+            wallet = futures[future]
+            try:
+                future.result()
+                logger.info(f"Кошелёк {wallet.address}: цикл компаундинга завершён")
+            except Exception as e:
+                errors[wallet.address] = e
+                logger.error(f"Кошелёк {wallet.address}: ошибка цикла компаундинга: {e}")
+                notifier = gas_trackers[wallet.address].notifier
+                if notifier is not None:
+                    notifier.notify(f"{wallet.address}: ошибка цикла компаундинга: {e}")
+
+    return errors
+
+
+def main():
+    # Один провайдер на все кошельки
+    web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
+    assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
+
+    wallets = load_wallets()
+    logger.info(f"Загружено кошельков: {len(wallets)}")
+
+    # Общие часы блоков: по ним ждём квитанции и сбрасываем кэш чтений
+    block_clock = BlockClock(web3).start()
+    reads = BlockCache(web3)
+    reads.follow(block_clock)
+    call_cache = install_call_cache(web3, reads)
+    gas_model = install_gas_model(web3, GasLimitModel())
+    notifier = TelegramNotifier()
+    gas_trackers = {wallet.address: GasTracker(web3, notifier, gas_model, block_clock) for wallet in wallets}
+    errors = run_wallets(web3, wallets, gas_trackers, reads)
+    logger.info(f"Кэш eth_call: {call_cache.stats()}")
+    logger.info(f"Лимиты газа: {gas_model.predicted} из модели, {gas_model.estimated} через eth_estimateGas")
+    notifier.flush(f"Curve Compounder: {len(wallets)} кошельков")
+    for address, gas_tracker in gas_trackers.items():
+        logger.info(f"Кошелёк {address}")
+        gas_tracker.print_summary()
+    notifier.close()
+    block_clock.stop()
+
+    if errors:
+        logger.error(f"Цикл компаундинга не завершили кошельков: {len(errors)} из {len(wallets)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+from config import TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096  # Ограничение Telegram на длину одного сообщения
+HTTP_TOO_MANY_REQUESTS = 429
+HTTP_SERVER_ERROR = 500
+MAX_RETRIES = 5
+RETRY_BACKOFF = 1.0  # Задержка перед первым повтором, с; дальше удваивается
+MAX_QUEUE = 100  # Сообщений в очереди на отправку
+
+_STOP = object()
+
+
+class TelegramNotifier:
+    """Отправка уведомлений в Telegram в отдельном потоке, не задерживая транзакции"""
+
+    def __init__(
+        self,
+        bot_token: str = TELEGRAM_BOT_TOKEN,
+        chat_id: str = TELEGRAM_CHAT_ID,
+        api_url: str = TELEGRAM_API_URL,
+    ):
+        self.url = f"{api_url.rstrip('/')}/bot{bot_token}/sendMessage"
+        self.chat_id = chat_id
+        self.max_retries = MAX_RETRIES
+        self.backoff = RETRY_BACKOFF
+        self.enabled = bool(bot_token and chat_id)
+
+        self._lines: list[str] = []
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=MAX_QUEUE)
+        self._thread = None
+        if self.enabled:
+            self._thread = threading.Thread(target=self._worker, name="telegram", daemon=True)
+            self._thread.start()
+
+    def notify(self, text: str) -> None:
+        """Добавляет строку в сообщение текущего цикла"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._lines.append(text)
+
+    def flush(self, title: str | None = None) -> None:
+        """Объединяет накопленные за цикл строки и ставит их в очередь на отправку"""
+        with self._lock:
+            lines, self._lines = self._lines, []
+        if not self.enabled or not lines:
+            return
+
+        if title:
+            lines.insert(0, title)
+
+        for message in _split_message(lines):
+            try:
+                self._queue.put_nowait(message)
+            except queue.Full:
+                logger.warning("Очередь уведомлений переполнена, сообщение отброшено")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Дожидается отправки очереди, но не дольше timeout секунд"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _worker(self) -> None:
+        while True:
+            message = self._queue.get()
+            if message is _STOP:
+                return
+            self._deliver(message)
+
+    def _deliver(self, message: str) -> None:
+        for attempt in range(self.max_retries):
+            delay = self.backoff * 2**attempt
+            try:
+                response = requests.post(self.url, json={"chat_id": self.chat_id, "text": message}, timeout=10)
+            except requests.RequestException as e:
+                logger.warning(f"Не удалось отправить уведомление (попытка {attempt + 1}): {e}")
+                time.sleep(delay)
+                continue
+
+            if response.ok:
+                return
+
+            if response.status_code == HTTP_TOO_MANY_REQUESTS or response.status_code >= HTTP_SERVER_ERROR:
+                # При 429 Telegram сообщает, сколько секунд нужно подождать
+                try:
+                    delay = max(delay, response.json()["parameters"]["retry_after"])
+                except (ValueError, KeyError, TypeError):
+                    pass
+                logger.warning(f"Telegram ответил {response.status_code}, повтор через {delay:.1f} с")
+                time.sleep(delay)
+                continue
+
+            logger.error(f"Telegram отклонил уведомление: {response.status_code} {response.text}")
+            return
+
+        logger.error(f"Уведомление не доставлено после {self.max_retries} попыток")
+
+
+def _split_message(lines: list[str]) -> list[str]:
+    """Разбивает строки на сообщения, не превышающие ограничение Telegram"""
+    messages: list[str] = []
+    current = ""
+    for line in lines:
+        chunk = line[:MAX_MESSAGE_LENGTH]
+        if current and len(current) + 1 + len(chunk) > MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = ""
+        current = f"{current}\n{chunk}" if current else chunk
+    if current:
+        messages.append(current)
+    return messages
@@ -1,12 +1,14 @@
 import logging
+import threading
 
 import requests
 from web3 import Web3
 
 import abis
 from addresses import CRV_ADDRESS, CRVUSD_ADDRESS, ONEINCH_ROUTER_ADDRESS
+from block_clock import BlockClock
 from config import ARBITRUM_RPC, ONEINCH_API_KEY, ONEINCH_API_URL, PRIVATE_KEY, WALLET_ADDRESS
-from utils import build_approve_tx, get_allowance, get_gas_fees, send_tx
+from utils import build_approve_tx, get_allowance, send_tx, tx_params
 
 
 logging.basicConfig(
@@ -16,68 +18,88 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Настройки
+DEFAULT_SLIPPAGE = 0.1  # %
+MAX_CONCURRENT_REQUESTS = 4  # Одновременных запросов к API 1inch на весь процесс, а не на кошелёк
 
+_requests_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
 
-# Инициализация Web3
-web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
-assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
 
-
-def get_quote(from_token, to_token, amount):
-    """Получение котировки от 1inch"""
-    url = f"{ONEINCH_API_URL}/quote"
+def _get(endpoint, params) -> dict:
+    """GET к API 1inch с общим на процесс ограничением параллельности. Ответ с ошибкой (429, 5xx)
+    или без dstAmount поднимает исключение, чтобы его не закэшировали как котировку"""
+    url = f"{ONEINCH_API_URL}/{endpoint}"
     headers = {
         "authorization": f"Bearer {ONEINCH_API_KEY}",
     }
+
+    with _requests_slots:
+        response = requests.get(url, headers=headers, params=params, timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    if "dstAmount" not in data:
+        raise ValueError(f"Ответ 1inch /{endpoint} без dstAmount: {data}")
+    return data
+
+
+def get_quote(from_token, to_token, amount):
+    """Получение котировки от 1inch"""
     params = {
         "src": from_token,
         "dst": to_token,
         "amount": amount,
     }
 
-    response = requests.get(url, headers=headers, params=params)
-    return response.json()
+    return _get("quote", params)
 
 
-def build_swap_tx(wallet_address, from_token, to_token, amount, slippage=0.1):
-    """Построение транзакции для обмена"""
-    url = f"{ONEINCH_API_URL}/swap"
-    headers = {
-        "authorization": f"Bearer {ONEINCH_API_KEY}",
-    }
+def get_swap(wallet_address, from_token, to_token, amount, options=None) -> dict:
+    """Ответ /swap 1inch: транзакция обмена и ожидаемое количество dstAmount.
+    options: дополнительные параметры запроса, например slippage или disableEstimate"""
     params = {
         "src": from_token,
         "dst": to_token,
         "amount": amount,
         "from": wallet_address,
         "origin": wallet_address,
-        "slippage": slippage,
+        "slippage": DEFAULT_SLIPPAGE,
+        **(options or {}),
     }
 
-    response = requests.get(url, headers=headers, params=params)
-    swap_data = response.json()
+    swap_data = _get("swap", params)
     logger.debug(swap_data)
+    return swap_data
 
-    tx = swap_data["tx"]
+
+def build_swap_tx(web3: Web3, swap: dict, tx_overrides=None):
+    """Построение транзакции для обмена по ответу /swap"""
+    tx = dict(swap["tx"])
     del tx["gasPrice"]
 
     tx.update(
         {
-            "from": wallet_address,
+            **tx_params(web3, Web3.to_checksum_address(tx["from"]), tx_overrides),
             "to": ONEINCH_ROUTER_ADDRESS,
-            "nonce": web3.eth.get_transaction_count(wallet_address),
-            "chainId": 42161,
             "value": int(tx["value"]),
-            **get_gas_fees(web3),
         }
     )
 
     return tx
 
 
+def get_swap_calldata(wallet_address, from_token, to_token, amount) -> str:
+    """Calldata обмена без проверки баланса и разрешения роутеру (disableEstimate): по ней оценивается
+    L1-часть газа обмена ещё до выдачи разрешения"""
+    swap = get_swap(wallet_address, from_token, to_token, amount, {"slippage": 1, "disableEstimate": "true"})
+    return swap["tx"]["data"]
+
+
 # Основная логика
 if __name__ == "__main__":
+    # Инициализация Web3
+    web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
+    assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
+    block_clock = BlockClock(web3).start()
+
     amount = int(float(input("Введите количество CRV для обмена: ")) * 10**18)
 
     # Проверяем баланс
@@ -110,16 +132,11 @@ if __name__ == "__main__":
         tx_hash = send_tx(web3, approve_tx, PRIVATE_KEY)
         logger.info(f"Транзакция разрешения: {tx_hash}")
 
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = block_clock.wait_for_receipt(tx_hash)
         logger.debug(f"Разрешение добавлено: {receipt}")
 
     # Совершаем обмен
-    swap_tx = build_swap_tx(
-        wallet_address=WALLET_ADDRESS,
-        from_token=CRV_ADDRESS,
-        to_token=CRVUSD_ADDRESS,
-        amount=amount,
-    )
+    swap_tx = build_swap_tx(web3, get_swap(WALLET_ADDRESS, CRV_ADDRESS, CRVUSD_ADDRESS, amount))
 
     swap_tx_hash = send_tx(web3, swap_tx, PRIVATE_KEY)
     logger.info(f"Транзакция обмена: {swap_tx_hash}")
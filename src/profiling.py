@@ -0,0 +1,168 @@
+import cProfile
+import glob
+import io
+import logging
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+import web3
+
+from config import DATA_DIR, PROFILE_KEEP, PROFILE_LABEL
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+SAMPLE_INTERVAL = 0.005  # Период сэмплирования стеков, с
+TOP_FUNCTIONS = 30
+
+# Режимы профилирования
+SAMPLING = "sample"  # только сэмплы стеков: накладные расходы малы, годится для продакшена
+DETERMINISTIC = "deterministic"  # ещё и cProfile основного потока: точные счётчики вызовов, цикл медленнее
+PROFILE_MODES = (SAMPLING, DETERMINISTIC)
+
+
+class CycleProfiler:
+    """Профиль цикла компаундинга по этапам: стеки в формате flamegraph (folded) и сводка горячих функций"""
+
+    def __init__(
+        self,
+        mode: str = SAMPLING,
+        profile_dir: str = PROFILE_DIR,
+        keep: int = PROFILE_KEEP,
+        interval: float = SAMPLE_INTERVAL,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Неизвестный режим профилирования {mode}, ожидается один из {PROFILE_MODES}")
+        self.mode = mode
+        self.profile_dir = profile_dir
+        self.keep = keep
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.stage_times: dict[str, list[float]] = {}  # этап -> [стена, CPU, число входов]
+
+        self._stages: dict[int, str] = {}  # поток -> текущий этап
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._profile = cProfile.Profile() if mode == DETERMINISTIC else None
+        self._started_at = datetime.now()
+
+    def start(self) -> "CycleProfiler":
+        self._started_at = datetime.now()
+        self._thread.start()
+        if self._profile is not None:
+            self._profile.enable()
+        return self
+
+    @contextmanager
+    def stage(self, name: str):
+        """Отмечает этап цикла в текущем потоке: время этапа и корень его стеков во flamegraph"""
+        thread_id = threading.get_ident()
+        previous = self._stages.get(thread_id)
+        self._stages[thread_id] = name if previous is None else f"{previous};{name}"
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            with self._lock:
+                totals = self.stage_times.setdefault(self._stages[thread_id], [0.0, 0.0, 0])
+                totals[0] += wall
+                totals[1] += cpu
+                totals[2] += 1
+            if previous is None:
+                del self._stages[thread_id]
+            else:
+                self._stages[thread_id] = previous
+
+    def stop(self) -> list[str]:
+        """Останавливает запись, сохраняет профиль и удаляет старые; возвращает пути записанных файлов"""
+        if self._profile is not None:
+            self._profile.disable()
+        self._stop.set()
+        self._thread.join()
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        run_id = self._started_at.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        if PROFILE_LABEL:
+            run_id += f"-{PROFILE_LABEL}"
+        prefix = os.path.join(self.profile_dir, run_id)
+
+        paths = [f"{prefix}.folded", f"{prefix}.txt"]
+        with open(paths[0], "w") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        with open(paths[1], "w") as f:
+            f.write(self.summary())
+        if self._profile is not None:
+            paths.append(f"{prefix}.pstats")
+            self._profile.dump_stats(paths[2])
+
+        self._apply_retention()
+        return paths
+
+    def summary(self, top: int = TOP_FUNCTIONS) -> str:
+        """Текстовая сводка: время этапов и top горячих функций"""
+        lines = [
+            f"Профиль цикла {self._started_at:%Y-%m-%d %H:%M:%S} {PROFILE_LABEL}".rstrip(),
+            f"Python {platform.python_version()}, web3 {web3.__version__}, режим {self.mode}, "
+            f"сэмплов {sum(self.samples.values())} с периодом {self.interval * 1000:.1f} мс",
+            "",
+            f"{'Этап':<40} {'Стена, с':>10} {'CPU, с':>10} {'Входов':>8}",
+        ]
+        for name, (wall, cpu, count) in sorted(self.stage_times.items(), key=lambda item: -item[1][0]):
+            lines.append(f"{name:<40} {wall:>10.3f} {cpu:>10.3f} {count:>8}")
+
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        for title, counter in (("собственных", own), ("включая вызванные", inclusive)):
+            lines += ["", f"Топ-{top} функций по сэмплам ({title}):"]
+            lines += [f"{count:>8}  {frame}" for frame, count in counter.most_common(top)]
+
+        if self._profile is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+            lines += ["", "cProfile основного потока:", stream.getvalue()]
+        return "\n".join(lines) + "\n"
+
+    def _sample(self) -> None:
+        # Сэмплируем только потоки внутри этапов цикла, чтобы простаивающие фоновые потоки не засоряли профиль
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, stage in list(self._stages.items()):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[";".join([stage, *reversed(stack)])] += 1
+
+    def _apply_retention(self) -> None:
+        """Хранит только keep последних профилей"""
+        runs = sorted({os.path.splitext(path)[0] for path in glob.glob(os.path.join(self.profile_dir, "*.txt"))})
+        for prefix in runs[: max(len(runs) - self.keep, 0)]:
+            for path in glob.glob(f"{glob.escape(prefix)}.*"):
+                os.remove(path)
+            logger.info(f"Удалён старый профиль {prefix}")
@@ -0,0 +1,155 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from web3 import Web3
+
+import abis
+from addresses import ONEINCH_ROUTER_ADDRESS, WETH_ADDRESS
+from cache import BlockCache
+from config import MIN_PROFIT_ETH
+from gas_cost import l1_gas_call
+from oneinch import get_quote, get_swap_calldata
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+SWAP_L2_GAS_ESTIMATE = 600_000  # Газ исполнения обмена 1inch на L2, пока модель газа его не видела
+QUOTE_WORKERS = 4  # Потоки котировок одного кошелька; общий лимит запросов к 1inch держит oneinch
+
+
+class RewardPosition(NamedTuple):
+    """Награда в одном токене: уже в кошельке и ещё не собранная в хранилище"""
+
+    token: str
+    held: int
+    claimable: int
+
+    @property
+    def amount(self) -> int:
+        return self.held + self.claimable
+
+
+def get_reward_tokens(web3: Web3, vault_address) -> list[str]:
+    """Дополнительные награды хранилища StakeDAO; CRV выплачивается через харвестер и в список не входит"""
+    vault = web3.eth.contract(address=Web3.to_checksum_address(vault_address), abi=abis.STAKE_DAO_VAULT)
+    return [Web3.to_checksum_address(token) for token in vault.functions.getRewardTokens().call()]
+
+
+def read_positions(web3: Web3, wallet_address, vault_address, tokens, reward_tokens) -> list[RewardPosition]:
+    """Балансы всех токенов и начисленные в хранилище награды одним пакетным запросом"""
+    vault = web3.eth.contract(address=Web3.to_checksum_address(vault_address), abi=abis.STAKE_DAO_VAULT)
+    with web3.batch_requests() as batch:
+        for token in tokens:
+            batch.add(web3.eth.contract(address=token, abi=abis.ERC20).functions.balanceOf(wallet_address))
+        for token in reward_tokens:
+            batch.add(vault.functions.earned(wallet_address, token))
+        results = batch.execute()
+
+    balances = dict(zip(tokens, results[: len(tokens)]))
+    earned = dict(zip(reward_tokens, results[len(tokens) :]))
+    return [RewardPosition(token, balances[token], earned.get(token, 0)) for token in tokens]
+
+
+def read_balances_and_allowances(web3: Web3, wallet_address, tokens, spender) -> dict[str, tuple[int, int]]:
+    """Баланс и разрешение для spender по каждому токену одним пакетным запросом"""
+    with web3.batch_requests() as batch:
+        for token in tokens:
+            contract = web3.eth.contract(address=token, abi=abis.ERC20)
+            batch.add(contract.functions.balanceOf(wallet_address))
+            batch.add(contract.functions.allowance(wallet_address, spender))
+        results = batch.execute()
+
+    return {token: (results[2 * i], results[2 * i + 1]) for i, token in enumerate(tokens)}
+
+
+def quote_in_eth(positions: list[RewardPosition], reads: BlockCache) -> list[int | None]:
+    """Стоимость каждой награды в wei ETH по котировкам 1inch; котировки запрашиваются параллельно.
+    None — котировку получить не удалось"""
+
+    def value_in_eth(position: RewardPosition) -> int | None:
+        if position.token == WETH_ADDRESS:
+            return position.amount
+        try:
+            quote = reads.get_or_fetch(
+                ("quote", position.token, WETH_ADDRESS, position.amount),
+                lambda: get_quote(position.token, WETH_ADDRESS, position.amount),
+            )
+        except Exception as e:
+            logger.warning(f"Нет котировки {position.token} → WETH: {e}")
+            return None
+        return int(quote["dstAmount"])
+
+    with ThreadPoolExecutor(max_workers=QUOTE_WORKERS, thread_name_prefix="quote") as executor:
+        return list(executor.map(value_in_eth, positions))
+
+
+def estimate_swap_costs(
+    web3: Web3, wallet_address, positions: list[RewardPosition], target_token, gas_model
+) -> list[int | None]:
+    """Полная стоимость обмена каждой награды в wei: L2-часть из модели газа, L1-часть по calldata 1inch
+    через gasEstimateL1Component. Разрешение роутеру для этого не нужно, поэтому решение об обмене
+    принимается до транзакции approve; None — стоимость оценить не удалось"""
+
+    def calldata(position: RewardPosition) -> str | None:
+        try:
+            return get_swap_calldata(wallet_address, position.token, target_token, position.amount)
+        except Exception as e:
+            logger.warning(f"Нет calldata обмена {position.token}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=QUOTE_WORKERS, thread_name_prefix="quote") as executor:
+        calldatas = list(executor.map(calldata, positions))
+
+    known = [data for data in calldatas if data is not None]
+    if not known:
+        return [None] * len(positions)
+    try:
+        with web3.batch_requests() as batch:
+            for data in known:
+                batch.add(l1_gas_call(web3, ONEINCH_ROUTER_ADDRESS, data))
+            l1_estimates = iter(batch.execute())
+    except Exception as e:
+        logger.warning(f"Не удалось оценить L1-часть газа обменов: {e}")
+        return [None] * len(positions)
+
+    costs = []
+    for data in calldatas:
+        if data is None:
+            costs.append(None)
+            continue
+        gas_for_l1, base_fee, _ = next(l1_estimates)
+        l2_gas = gas_model.l2_gas(ONEINCH_ROUTER_ADDRESS, data) if gas_model is not None else None
+        costs.append(((SWAP_L2_GAS_ESTIMATE if l2_gas is None else l2_gas) + gas_for_l1) * base_fee)
+    return costs
+
+
+def is_profitable(value_wei: int, cost_wei: int) -> bool:
+    """Единое правило компаундинга: стоимость награды за вычетом газа (L1 + L2) не меньше MIN_PROFIT_ETH"""
+    return value_wei - cost_wei >= Web3.to_wei(MIN_PROFIT_ETH, "ether")
+
+
+def plan_swaps(
+    positions: list[RewardPosition], values: list[int | None], costs: list[int | None]
+) -> list[RewardPosition]:
+    """Оставляет награды, обмен которых выгоден; остальные, в том числе без котировки или оценки газа,
+    копятся до следующего цикла"""
+    plan = []
+    for position, value, cost in zip(positions, values, costs):
+        if value is None:
+            logger.info(f"Стоимость награды {position.token} неизвестна, копим до следующего цикла")
+            continue
+        if cost is None or not is_profitable(value, cost):
+            cost_text = "неизвестна" if cost is None else f"≈ {Web3.from_wei(cost, 'ether'):.6f} ETH"
+            logger.info(
+                f"Награда {position.token} ≈ {Web3.from_wei(value, 'ether'):.6f} ETH, стоимость обмена {cost_text}: "
+                f"выгода ниже {MIN_PROFIT_ETH} ETH, копим до следующего цикла"
+            )
+            continue
+        plan.append(position)
+    return plan
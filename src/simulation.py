@@ -0,0 +1,950 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from eth_abi import decode, encode
+from eth_account import Account
+from eth_account.typed_transactions import TypedTransaction
+from eth_utils import abi_to_signature, function_abi_to_4byte_selector, get_abi_input_types, get_abi_output_types
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.providers import JSONBaseProvider
+
+import abis
+import journal
+import oneinch
+import unwind
+from addresses import (
+    ARBITRUM_NODE_INTERFACE_ADDRESS,
+    CRV_ADDRESS,
+    CRVUSD_ADDRESS,
+    GMAC_CRVUSD_ETH_GAUGE_ADDRESS,
+    GMAC_CRVUSD_ETH_POOL_ADDRESS,
+    GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS,
+    ONEINCH_ROUTER_ADDRESS,
+    STAKE_DAO_HARVESTER_ADDRESS,
+    WETH_ADDRESS,
+)
+from block_clock import BlockClock
+from cache import BlockCache, install_call_cache
+from config import ARBITRUM_CHAIN_ID, MAX_PARALLEL_WALLETS
+from gas_model import GasLimitModel, install_gas_model
+from multi_wallet import RunContext, run_wallets
+from notifications import TelegramNotifier
+from profiling import CycleProfiler
+from tx_assembly import FunctionEncoder
+from utils import GasTracker
+from wallet import Wallet
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+BASE_FEE = 10_000_000  # 0.01 gwei, типичный baseFee Arbitrum
+PRIORITY_FEE = 0
+L1_GAS_PER_BYTE = 40  # L1-часть газа на байт calldata в единицах L2-газа
+L1_BASE_FEE = BASE_FEE * L1_GAS_PER_BYTE // 16  # l1BaseFeeEstimate, согласованный с L1_GAS_PER_BYTE
+DEFAULT_GAS = 100_000
+# Газ L2 действий заглушек; порядок величин как у настоящих контрактов
+GAS_BY_FUNCTION = {
+    "approve": 46_000,
+    "claim": 250_000,
+    "swap": 450_000,
+    "add_liquidity": 350_000,
+    "deposit": 200_000,
+    "withdraw": 180_000,
+    "remove_liquidity_one_coin": 250_000,
+}
+BLOCK_POLL_INTERVAL = 0.05  # Опрос eth_blockNumber часами блоков, с
+# Ответы заглушки Telegram на первые запросы: проверяют ожидание retry_after и повтор после ошибки сервера
+TELEGRAM_FAILURES = (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.BAD_GATEWAY)
+TELEGRAM_RETRY_AFTER = 1  # с
+TELEGRAM_BACKOFF = 0.05  # Задержка повтора уведомителя в симуляции, с
+MAX_RPC_PER_WALLET = 80  # Порог запросов к ноде на кошелёк за цикл; сейчас около 60-65
+# Фоновые запросы, число которых зависит от длительности цикла, а не от числа кошельков: в порог не входят
+BACKGROUND_METHODS = ("eth_blockNumber",)
+WITHDRAW_FEE = 0.001  # Комиссия пула при выводе в одну монету
+
+# Цены в wei ETH за 10**18 единиц токена
+PRICES = {
+    WETH_ADDRESS: 10**18,
+    CRVUSD_ADDRESS: 10**18 // 3000,
+    CRV_ADDRESS: 10**18 // 5000,
+}
+LP_PRICE = 10**18 // 1000  # Цена LP токена пула в wei ETH
+POSITION_SIZE = 1000 * 10**18  # LP токенов на кошелёк при открытии позиции
+CRV_PER_SHARE = 10**17  # CRV за цикл на LP токен в хранилище
+EXTRA_PER_SHARE = 10**16  # Дополнительной награды за цикл на LP токен
+
+# Роутер 1inch в abis.py не описан: заглушке хватает одной функции обмена
+ONEINCH_ROUTER_ABI = [
+    {
+        "type": "function",
+        "name": "swap",
+        "stateMutability": "nonpayable",
+        "inputs": [
+            {"name": "src", "type": "address"},
+            {"name": "dst", "type": "address"},
+            {"name": "amount", "type": "uint256"},
+            {"name": "minReturn", "type": "uint256"},
+        ],
+        "outputs": [{"name": "returnAmount", "type": "uint256"}],
+    }
+]
+
+
+def _address(label: str) -> str:
+    return Web3.to_checksum_address(Web3.keccak(text=label)[-20:])
+
+
+GMAC_ADDRESS = _address("simulation:GMAC")
+EXTRA_REWARD_ADDRESS = _address("simulation:ARB")
+
+
+class Revert(Exception):
+    """Отмена выполнения в контракте-заглушке"""
+
+
+def function(signature: str, view: bool | None = None):
+    """Помечает метод заглушки как реализацию функции ABI с указанной сигнатурой;
+    view переопределяет stateMutability из ABI"""
+
+    def decorate(method):
+        method.signature = signature
+        method.view = view
+        return method
+
+    return decorate
+
+
+def _checksum(value, abi_type: str):
+    if abi_type == "address":
+        return Web3.to_checksum_address(value)
+    if abi_type == "address[]":
+        return [Web3.to_checksum_address(item) for item in value]
+    return value
+
+
+class StandInContract:
+    """Контракт-заглушка на Python: принимает calldata по ABI из abis.py и отвечает в том же формате"""
+
+    ABI: list = []
+
+    def __init__(self, chain: "SimulatedChain", address: str):
+        self.chain = chain
+        self.address = address
+        self.functions = {}
+
+        abi_by_signature = {abi_to_signature(item): item for item in self.ABI if item.get("type") == "function"}
+        for name in dir(type(self)):
+            method = getattr(self, name)
+            signature = getattr(method, "signature", None)
+            if signature is None:
+                continue
+            # KeyError здесь значит, что заглушка разошлась с ABI
+            item = abi_by_signature[signature]
+            self.functions[function_abi_to_4byte_selector(item)] = (
+                method,
+                get_abi_input_types(item),
+                get_abi_output_types(item),
+                item.get("stateMutability") in ("view", "pure") if method.view is None else method.view,
+            )
+
+    def function_name(self, data: bytes) -> str | None:
+        entry = self.functions.get(data[:4])
+        return entry[0].__name__ if entry is not None else None
+
+    def execute(self, sender: str, data: bytes, static: bool) -> bytes:
+        entry = self.functions.get(data[:4])
+        if entry is None:
+            raise Revert(f"неизвестный селектор {Web3.to_hex(data[:4])}")
+        method, input_types, output_types, is_view = entry
+        if static and not is_view:
+            # Состояние заглушек не откатывается, поэтому изменяющие вызовы выполняются только в транзакциях
+            raise Revert(f"{method.__name__} изменяет состояние и недоступна в eth_call")
+
+        args = [_checksum(value, abi_type) for value, abi_type in zip(decode(input_types, data[4:]), input_types)]
+        result = method(sender, *args)
+        if not output_types:
+            return b""
+        return encode(output_types, result if len(output_types) > 1 else (result,))
+
+
+class Token(StandInContract):
+    ABI = abis.ERC20
+
+    def __init__(self, chain: "SimulatedChain", address: str, token_symbol: str):
+        super().__init__(chain, address)
+        self.token_symbol = token_symbol
+        self.balances: dict[str, int] = defaultdict(int)
+        self.allowances: dict[tuple[str, str], int] = defaultdict(int)
+        self.total_supply = 0
+
+    def mint(self, account: str, amount: int) -> None:
+        self.balances[account] += amount
+        self.total_supply += amount
+
+    def burn(self, account: str, amount: int) -> None:
+        if self.balances[account] < amount:
+            raise Revert(f"{self.token_symbol}: недостаточно средств")
+        self.balances[account] -= amount
+        self.total_supply -= amount
+
+    def pull(self, owner: str, spender: str, amount: int) -> None:
+        """transferFrom от имени spender на его же адрес"""
+        self.transfer_from(spender, owner, spender, amount)
+
+    def _transfer(self, sender: str, to: str, amount: int) -> None:
+        if self.balances[sender] < amount:
+            raise Revert(f"{self.token_symbol}: недостаточно средств")
+        self.balances[sender] -= amount
+        self.balances[to] += amount
+
+    @function("name()")
+    def name(self, sender):
+        return self.token_symbol
+
+    @function("symbol()")
+    def symbol(self, sender):
+        return self.token_symbol
+
+    @function("decimals()")
+    def decimals(self, sender):
+        return 18
+
+    @function("totalSupply()")
+    def total_supply_of(self, sender):
+        return self.total_supply
+
+    @function("balanceOf(address)")
+    def balance_of(self, sender, account):
+        return self.balances[account]
+
+    @function("allowance(address,address)")
+    def allowance(self, sender, owner, spender):
+        return self.allowances[(owner, spender)]
+
+    @function("approve(address,uint256)")
+    def approve(self, sender, spender, amount):
+        self.allowances[(sender, spender)] = amount
+        return True
+
+    @function("transfer(address,uint256)")
+    def transfer(self, sender, to, amount):
+        self._transfer(sender, to, amount)
+        return True
+
+    @function("transferFrom(address,address,uint256)")
+    def transfer_from(self, sender, owner, to, amount):
+        if self.allowances[(owner, sender)] < amount:
+            raise Revert(f"{self.token_symbol}: недостаточно разрешения")
+        if self.balances[owner] < amount:
+            raise Revert(f"{self.token_symbol}: недостаточно средств")
+        self.allowances[(owner, sender)] -= amount
+        self._transfer(owner, to, amount)
+        return True
+
+
+class TricryptoPool(Token):
+    """Пул crvUSD/ETH/GMAC, он же LP токен; цены фиксированы"""
+
+    ABI = abis.CURVE_TRICRYPTO_POOL
+
+    def __init__(self, chain: "SimulatedChain", address: str, coins: list[str]):
+        super().__init__(chain, address, "TriGemach")
+        self.coins = coins
+
+    def _value(self, amounts) -> int:
+        return sum(amount * self.chain.prices[coin] for coin, amount in zip(self.coins, amounts))
+
+    @function("coins(uint256)")
+    def coin(self, sender, i):
+        return self.coins[i]
+
+    @function("calc_token_amount(uint256[3],bool)")
+    def calc_token_amount(self, sender, amounts, deposit):
+        return self._value(amounts) // LP_PRICE
+
+    @function("calc_withdraw_one_coin(uint256,uint256)")
+    def calc_withdraw_one_coin(self, sender, token_amount, i):
+        return int(token_amount * LP_PRICE // self.chain.prices[self.coins[i]] * (1 - WITHDRAW_FEE))
+
+    @function("add_liquidity(uint256[3],uint256,bool)")
+    def add_liquidity(self, sender, amounts, min_mint_amount, use_eth=False):
+        minted = self.calc_token_amount(sender, amounts, True)
+        if minted < min_mint_amount:
+            raise Revert("проскальзывание add_liquidity")
+        for coin, amount in zip(self.coins, amounts):
+            if amount:
+                self.chain.contracts[coin].pull(sender, self.address, amount)
+        self.mint(sender, minted)
+        return minted
+
+    @function("add_liquidity(uint256[3],uint256)")
+    def add_liquidity_default(self, sender, amounts, min_mint_amount):
+        return self.add_liquidity(sender, amounts, min_mint_amount)
+
+    @function("remove_liquidity_one_coin(uint256,uint256,uint256)")
+    def remove_liquidity_one_coin(self, sender, token_amount, i, min_amount):
+        amount = self.calc_withdraw_one_coin(sender, token_amount, i)
+        if amount < min_amount:
+            raise Revert("проскальзывание remove_liquidity_one_coin")
+        self.burn(sender, token_amount)
+        self.chain.contracts[self.coins[i]].mint(sender, amount)
+        return amount
+
+
+class StakeDaoVault(Token):
+    """Хранилище StakeDAO: доли 1:1 к LP токену, награды начисляются вызовом accrue()"""
+
+    ABI = abis.STAKE_DAO_VAULT
+
+    def __init__(self, chain: "SimulatedChain", address: str, asset: str, gauge: str, reward_tokens: list[str]):
+        super().__init__(chain, address, "sd-TriGemach-vault")
+        self.asset_address = asset
+        self.gauge_address = gauge
+        self.reward_tokens = reward_tokens
+        self.earned_rewards: dict[tuple[str, str], int] = defaultdict(int)
+        self.pending_crv: dict[str, int] = defaultdict(int)
+
+    def accrue(self, crv_per_share: int, extra_per_share: int) -> None:
+        for account, shares in self.balances.items():
+            self.pending_crv[account] += shares * crv_per_share // 10**18
+            for token in self.reward_tokens:
+                self.earned_rewards[(account, token)] += shares * extra_per_share // 10**18
+
+    @function("asset()")
+    def asset(self, sender):
+        return self.asset_address
+
+    @function("gauge()")
+    def gauge(self, sender):
+        return self.gauge_address
+
+    @function("getRewardTokens()")
+    def get_reward_tokens(self, sender):
+        return self.reward_tokens
+
+    @function("earned(address,address)")
+    def earned(self, sender, account, token):
+        return self.earned_rewards[(account, token)]
+
+    @function("getClaimable(address,address)")
+    def get_claimable(self, sender, token, account):
+        return self.earned_rewards[(account, token)]
+
+    @function("maxWithdraw(address)")
+    def max_withdraw(self, sender, owner):
+        return self.balances[owner]
+
+    @function("deposit(uint256,address)")
+    def deposit(self, sender, assets, receiver):
+        self.chain.contracts[self.asset_address].pull(sender, self.address, assets)
+        self.mint(sender if int(receiver, 16) == 0 else receiver, assets)
+        return assets
+
+    @function("withdraw(uint256,address,address)")
+    def withdraw(self, sender, assets, receiver, owner):
+        if owner != sender:
+            raise Revert("вывод только владельцем")
+        self.burn(owner, assets)
+        self.chain.contracts[self.asset_address]._transfer(self.address, receiver, assets)
+        return assets
+
+    @function("claim(address[],address)")
+    def claim(self, sender, tokens, receiver):
+        amounts = []
+        for token in tokens:
+            amount = self.earned_rewards.pop((sender, token), 0)
+            self.chain.contracts[token].mint(receiver, amount)
+            amounts.append(amount)
+        return amounts
+
+
+class StakeDaoHarvester(StandInContract):
+    """Выплата CRV, накопленного в хранилищах, по списку гейджей"""
+
+    ABI = abis.STAKE_DAO_HARVERSTER
+
+    @function("claim(address[],bytes[])")
+    def claim(self, sender, gauges, harvest_data):
+        for gauge in gauges:
+            vault = self.chain.vaults_by_gauge[gauge]
+            self.chain.contracts[CRV_ADDRESS].mint(sender, vault.pending_crv.pop(sender, 0))
+
+    @function("getPendingRewards(address,address)")
+    def get_pending_rewards(self, sender, vault, account):
+        return self.chain.contracts[vault].pending_crv[account]
+
+
+class OneInchRouter(StandInContract):
+    ABI = ONEINCH_ROUTER_ABI
+
+    @function("swap(address,address,uint256,uint256)")
+    def swap(self, sender, src, dst, amount, min_return):
+        return_amount = self.chain.convert(src, dst, amount)
+        if return_amount < min_return:
+            raise Revert("проскальзывание 1inch")
+        self.chain.contracts[src].pull(sender, self.address, amount)
+        self.chain.contracts[dst].mint(sender, return_amount)
+        return return_amount
+
+
+class NodeInterface(StandInContract):
+    ABI = abis.ARBITRUM_NODE_INTERFACE
+
+    # В ABI прекомпиль помечен как изменяющий состояние, хотя вызывается только через eth_call
+    @function("gasEstimateComponents(address,bool,bytes)", view=True)
+    def gas_estimate_components(self, sender, to, contract_creation, data):
+        l2_gas, l1_gas = self.chain.gas_for(to, data)
+        return l2_gas + l1_gas, l1_gas, self.chain.base_fee, L1_BASE_FEE
+
+    @function("gasEstimateL1Component(address,bool,bytes)", view=True)
+    def gas_estimate_l1_component(self, sender, to, contract_creation, data):
+        return self.chain.gas_for(to, data)[1], self.chain.base_fee, L1_BASE_FEE
+
+
+class SimulatedChain:
+    """Состояние локальной цепочки: заглушки контрактов, nonce, транзакции и квитанции"""
+
+    def __init__(self, base_fee: int = BASE_FEE):
+        self.base_fee = base_fee
+        self.block_number = 1
+        self.contracts: dict[str, StandInContract] = {}
+        self.vaults_by_gauge: dict[str, StakeDaoVault] = {}
+        self.prices = {**PRICES, GMAC_ADDRESS: 10**18 // 100000, EXTRA_REWARD_ADDRESS: 10**18 // 10000}
+        self.nonces: dict[str, int] = defaultdict(int)
+        self.transactions: dict[str, dict] = {}
+        self.receipts: dict[str, dict] = {}
+        self.lock = threading.RLock()
+
+    def deploy(self, contract: StandInContract) -> StandInContract:
+        self.contracts[contract.address] = contract
+        return contract
+
+    def convert(self, src: str, dst: str, amount: int) -> int:
+        return amount * self.prices[src] // self.prices[dst]
+
+    def gas_for(self, to: str, data: bytes) -> tuple[int, int]:
+        """Газ действия: L2-часть по таблице и L1-часть по длине calldata"""
+        contract = self.contracts.get(Web3.to_checksum_address(to))
+        name = contract.function_name(data) if contract is not None else None
+        return GAS_BY_FUNCTION.get(name, DEFAULT_GAS), len(data) * L1_GAS_PER_BYTE
+
+    def call(self, sender: str, to: str, data: bytes) -> bytes:
+        with self.lock:
+            contract = self.contracts.get(Web3.to_checksum_address(to))
+            if contract is None:
+                return b""
+            return contract.execute(sender, data, static=True)
+
+    def send_raw_transaction(self, raw_transaction: bytes) -> str:
+        """Проверяет и сразу включает транзакцию в собственный блок"""
+        tx = TypedTransaction.from_bytes(HexBytes(raw_transaction)).as_dict()
+        sender = Account.recover_transaction(raw_transaction)
+        tx_hash = Web3.to_hex(Web3.keccak(raw_transaction))
+        to = Web3.to_checksum_address(tx["to"])
+        data = bytes(tx["data"])
+
+        with self.lock:
+            if tx["chainId"] != ARBITRUM_CHAIN_ID:
+                raise ValueError(f"неверный chainId {tx['chainId']}")
+            if tx["nonce"] != self.nonces[sender]:
+                raise ValueError(f"nonce {tx['nonce']}, ожидается {self.nonces[sender]}")
+            if tx["maxFeePerGas"] < self.base_fee:
+                raise ValueError("maxFeePerGas ниже baseFee")
+
+            self.nonces[sender] += 1
+            self.block_number += 1
+            l2_gas, l1_gas = self.gas_for(to, data)
+            status = 1
+            if tx["gas"] < l2_gas + l1_gas:
+                status = 0
+            else:
+                try:
+                    self.contracts[to].execute(sender, data, static=False)
+                except Revert as e:
+                    logger.debug(f"Транзакция {tx_hash} отменена: {e}")
+                    status = 0
+
+            gas_price = min(tx["maxFeePerGas"], self.base_fee + tx["maxPriorityFeePerGas"])
+            block = {"blockNumber": hex(self.block_number), "blockHash": _block_hash(self.block_number)}
+            self.transactions[tx_hash] = {
+                **block,
+                "hash": tx_hash,
+                "from": sender,
+                "to": to,
+                "input": Web3.to_hex(data),
+                "value": hex(tx["value"]),
+                "nonce": hex(tx["nonce"]),
+                "gas": hex(tx["gas"]),
+                "gasPrice": hex(gas_price),
+                "maxFeePerGas": hex(tx["maxFeePerGas"]),
+                "maxPriorityFeePerGas": hex(tx["maxPriorityFeePerGas"]),
+                "chainId": hex(tx["chainId"]),
+                "type": "0x2",
+                "transactionIndex": "0x0",
+            }
+            gas_used = min(tx["gas"], l2_gas + l1_gas)
+            self.receipts[tx_hash] = {
+                **block,
+                "transactionHash": tx_hash,
+                "transactionIndex": "0x0",
+                "from": sender,
+                "to": to,
+                "status": hex(status),
+                "gasUsed": hex(gas_used),
+                "gasUsedForL1": hex(l1_gas),
+                "cumulativeGasUsed": hex(gas_used),
+                "effectiveGasPrice": hex(gas_price),
+                "contractAddress": None,
+                "logs": [],
+                "logsBloom": "0x" + "00" * 256,
+                "type": "0x2",
+            }
+        return tx_hash
+
+    def open_position(self, account: str, amount: int) -> None:
+        """Позиция кошелька в хранилище без транзакций: LP токены сразу лежат в хранилище"""
+        with self.lock:
+            vault = self.contracts[GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS]
+            self.contracts[GMAC_CRVUSD_ETH_POOL_ADDRESS].mint(vault.address, amount)
+            vault.mint(account, amount)
+
+    def accrue_rewards(self, crv_per_share: int = CRV_PER_SHARE, extra_per_share: int = EXTRA_PER_SHARE) -> None:
+        with self.lock:
+            for vault in self.vaults_by_gauge.values():
+                vault.accrue(crv_per_share, extra_per_share)
+
+
+def _block_hash(block_number: int) -> str:
+    return Web3.to_hex(Web3.keccak(block_number.to_bytes(32, "big")))
+
+
+def build_chain() -> SimulatedChain:
+    """Цепочка с заглушками по адресам из addresses.py, чтобы цикл работал без изменений"""
+    chain = SimulatedChain()
+    for address, token_symbol in (
+        (CRV_ADDRESS, "CRV"),
+        (CRVUSD_ADDRESS, "crvUSD"),
+        (WETH_ADDRESS, "WETH"),
+        (GMAC_ADDRESS, "GMAC"),
+        (EXTRA_REWARD_ADDRESS, "ARB"),
+    ):
+        chain.deploy(Token(chain, address, token_symbol))
+
+    chain.deploy(TricryptoPool(chain, GMAC_CRVUSD_ETH_POOL_ADDRESS, [CRVUSD_ADDRESS, WETH_ADDRESS, GMAC_ADDRESS]))
+    vault = chain.deploy(
+        StakeDaoVault(
+            chain,
+            GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS,
+            GMAC_CRVUSD_ETH_POOL_ADDRESS,
+            GMAC_CRVUSD_ETH_GAUGE_ADDRESS,
+            [EXTRA_REWARD_ADDRESS],
+        )
+    )
+    chain.vaults_by_gauge[GMAC_CRVUSD_ETH_GAUGE_ADDRESS] = vault
+    chain.deploy(StakeDaoHarvester(chain, STAKE_DAO_HARVESTER_ADDRESS))
+    chain.deploy(OneInchRouter(chain, ONEINCH_ROUTER_ADDRESS))
+    chain.deploy(NodeInterface(chain, ARBITRUM_NODE_INTERFACE_ADDRESS))
+    return chain
+
+
+class SimulatedProvider(JSONBaseProvider):
+    """Провайдер web3 поверх SimulatedChain со счётчиком запросов; latency имитирует задержку сети"""
+
+    def __init__(self, chain: SimulatedChain, latency: float = 0.0):
+        super().__init__()
+        self.chain = chain
+        self.latency = latency
+        self.requests: Counter = Counter()
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def make_request(self, method, params):
+        self._round_trip([method])
+        return self._respond(method, params, 0)
+
+    def make_batch_request(self, requests):
+        self._round_trip([method for method, _ in requests])
+        return [self._respond(method, params, i) for i, (method, params) in enumerate(requests)]
+
+    def _round_trip(self, methods) -> None:
+        with self._lock:
+            self.round_trips += 1
+            self.requests.update(methods)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _respond(self, method, params, request_id):
+        try:
+            result = getattr(self, f"_{method}")(*params)
+        except Revert as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": 3, "message": f"execution reverted: {e}"}}
+        except (AttributeError, ValueError) as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32000, "message": str(e)}}
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def _web3_clientVersion(self):
+        return "simulation"
+
+    def _eth_chainId(self):
+        return hex(ARBITRUM_CHAIN_ID)
+
+    def _eth_blockNumber(self):
+        return hex(self.chain.block_number)
+
+    def _eth_gasPrice(self):
+        return hex(self.chain.base_fee)
+
+    def _eth_feeHistory(self, block_count, newest_block, reward_percentiles):
+        block_count = int(block_count, 16) if isinstance(block_count, str) else block_count
+        return {
+            "oldestBlock": hex(max(self.chain.block_number - block_count + 1, 0)),
+            "baseFeePerGas": [hex(self.chain.base_fee)] * (block_count + 1),
+            "gasUsedRatio": [0.5] * block_count,
+            "reward": [[hex(PRIORITY_FEE)] for _ in reward_percentiles] * block_count,
+        }
+
+    def _eth_getTransactionCount(self, address, block_identifier="latest"):
+        return hex(self.chain.nonces[Web3.to_checksum_address(address)])
+
+    def _eth_call(self, tx, block_identifier="latest"):
+        data = Web3.to_bytes(hexstr=tx.get("data", tx.get("input", "0x")))
+        return Web3.to_hex(self.chain.call(tx.get("from", _address("simulation:caller")), tx["to"], data))
+
+    def _eth_estimateGas(self, tx, block_identifier=None):
+        l2_gas, l1_gas = self.chain.gas_for(tx["to"], Web3.to_bytes(hexstr=tx.get("data", tx.get("input", "0x"))))
+        return hex(l2_gas + l1_gas)
+
+    def _eth_sendRawTransaction(self, raw_transaction):
+        return self.chain.send_raw_transaction(Web3.to_bytes(hexstr=raw_transaction))
+
+    def _eth_getTransactionReceipt(self, tx_hash):
+        return self.chain.receipts.get(tx_hash)
+
+    def _eth_getTransactionByHash(self, tx_hash):
+        return self.chain.transactions.get(tx_hash)
+
+
+class OneInchStandIn:
+    """Локальная замена API 1inch: /quote и /swap по ценам цепочки, обмен через заглушку роутера"""
+
+    def __init__(self, chain: SimulatedChain):
+        self.chain = chain
+        self.requests: Counter = Counter()
+        self._swap = FunctionEncoder(ONEINCH_ROUTER_ABI[0])
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, name="oneinch-stand-in", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OneInchStandIn":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, path: str, query: dict) -> dict:
+        endpoint = path.rsplit("/", 1)[-1]
+        self.requests[endpoint] += 1
+        src = Web3.to_checksum_address(query["src"])
+        dst = Web3.to_checksum_address(query["dst"])
+        amount = int(query["amount"])
+        dst_amount = self.chain.convert(src, dst, amount)
+        if endpoint == "quote":
+            return {"dstAmount": str(dst_amount)}
+
+        min_return = int(dst_amount * (1 - float(query.get("slippage", 1)) / 100))
+        return {
+            "dstAmount": str(dst_amount),
+            "tx": {
+                "from": query["from"],
+                "to": ONEINCH_ROUTER_ADDRESS,
+                "data": Web3.to_hex(self._swap.encode(src, dst, amount, min_return)),
+                "value": "0",
+                "gas": GAS_BY_FUNCTION["swap"],
+                "gasPrice": str(self.chain.base_fee),
+            },
+        }
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                body = json.dumps(stand_in.respond(url.path, query)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class TelegramStandIn:
+    """Локальная замена Bot API Telegram: принимает sendMessage и запоминает тексты сообщений.
+    Первые запросы получают ответы из failures (429 с retry_after или 5xx), чтобы проверить повторы отправки"""
+
+    def __init__(self, failures=TELEGRAM_FAILURES):
+        self.messages: list[str] = []
+        self.failures = list(failures)
+        self.rejected: Counter = Counter()  # статус -> сколько раз им ответили
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, name="telegram-stand-in", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "TelegramStandIn":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, payload: dict) -> tuple[int, dict]:
+        with self._lock:
+            status = self.failures.pop(0) if self.failures else HTTPStatus.OK
+            if status == HTTPStatus.OK:
+                self.messages.append(payload["text"])
+                return status, {"ok": True}
+            self.rejected[status] += 1
+
+        body = {"ok": False, "error_code": status, "description": HTTPStatus(status).phrase}
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            body["parameters"] = {"retry_after": TELEGRAM_RETRY_AFTER}
+        return status, body
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                status, response = stand_in.respond(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                body = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _private_key(index: int) -> str:
+    return Web3.to_hex(Web3.keccak(text=f"simulation:wallet:{index}"))
+
+
+def run_unwind(web3: Web3, wallets: list[Wallet], gas_tracker: GasTracker) -> dict:
+    """Экстренный выход всех кошельков теми же функциями, что и unwind.py; статистика выхода"""
+    provider = web3.provider
+    round_trips_before = provider.round_trips
+    started = time.perf_counter()
+
+    unwinds = unwind.read_legs(web3, [wallet.address for wallet in wallets])
+    txs = unwind.build_unwind_txs(web3, unwinds, unwind.aggressive_fees(web3), gas_tracker.gas_model)
+    by_address = {wallet.address: wallet for wallet in wallets}
+    signed_txs = [by_address[address].sign(tx) for address, _, tx in txs]
+    errors = unwind.broadcast(web3, signed_txs) if signed_txs else []
+    failed = unwind.wait_for_unwind(gas_tracker, txs, signed_txs, errors)
+
+    return {
+        "seconds": time.perf_counter() - started,
+        "positions": sum(len(wallet_unwind.legs) for wallet_unwind in unwinds),
+        "transactions": len(txs),
+        "failed": len(failed),
+        "rpc_round_trips": provider.round_trips - round_trips_before,
+        "open_positions": sum(len(wallet_unwind.legs) for wallet_unwind in unwind.read_legs(web3, list(by_address))),
+    }
+
+
+def run_simulation(
+    wallet_count: int, cycles: int, max_workers: int = MAX_PARALLEL_WALLETS, latency: float = 0.0
+) -> dict:
+    """Полные циклы multi_wallet.run_wallets для wallet_count кошельков против заглушек и выход из позиций;
+    статистика по циклам, выходу, уведомлениям и этапам профиля"""
+    chain = build_chain()
+    provider = SimulatedProvider(chain, latency)
+    web3 = Web3(provider)
+    wallets = [Wallet(_private_key(i)) for i in range(wallet_count)]
+    for wallet in wallets:
+        chain.open_position(wallet.address, POSITION_SIZE)
+
+    oneinch_stand_in = OneInchStandIn(chain).start()
+    oneinch.ONEINCH_API_URL = oneinch_stand_in.url
+    telegram_stand_in = TelegramStandIn().start()
+
+    # Часы блоков в режиме опроса по HTTP, как при недоступном WebSocket
+    block_clock = BlockClock(web3, ws_url="", poll_interval=BLOCK_POLL_INTERVAL).start()
+    reads = BlockCache(web3)
+    reads.follow(block_clock)
+    call_cache = install_call_cache(web3, reads)
+    gas_model = install_gas_model(web3, GasLimitModel(path=None))
+    notifier = TelegramNotifier("simulation", "simulation", telegram_stand_in.url)
+    notifier.backoff = TELEGRAM_BACKOFF
+    vault = chain.contracts[GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS]
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as data_dir:
+            journal.JOURNAL_DIR = os.path.join(data_dir, "journal")
+            profiler = CycleProfiler(profile_dir=os.path.join(data_dir, "profiles")).start()
+            context = RunContext(max_workers, profiler)
+            for cycle in range(cycles):
+                chain.accrue_rewards()
+                requests_before = provider.requests.copy()
+                round_trips_before = provider.round_trips
+                oneinch_before = sum(oneinch_stand_in.requests.values())
+                shares_before = sum(vault.balances[wallet.address] for wallet in wallets)
+                gas_trackers = {
+                    wallet.address: GasTracker(web3, notifier, gas_model, block_clock) for wallet in wallets
+                }
+
+                started = time.perf_counter()
+                errors = run_wallets(web3, wallets, gas_trackers, reads, context)
+                elapsed = time.perf_counter() - started
+                notifier.flush(f"Симуляция: цикл {cycle + 1}")
+
+                requests = provider.requests - requests_before
+                results.append(
+                    {
+                        "cycle": cycle + 1,
+                        "wallets": wallet_count,
+                        "failed": len(errors),
+                        "seconds": elapsed,
+                        "wallets_per_second": wallet_count / elapsed,
+                        "transactions": sum(len(tracker.transactions) for tracker in gas_trackers.values()),
+                        "rpc_requests": sum(requests.values()),
+                        "wallet_rpc_requests": sum(
+                            count for method, count in requests.items() if method not in BACKGROUND_METHODS
+                        ),
+                        "rpc_round_trips": provider.round_trips - round_trips_before,
+                        "rpc_by_method": dict(requests.most_common()),
+                        "oneinch_requests": sum(oneinch_stand_in.requests.values()) - oneinch_before,
+                        "deposited": sum(vault.balances[wallet.address] for wallet in wallets) - shares_before,
+                    }
+                )
+            profiler.stop()
+
+        unwind_result = run_unwind(web3, wallets, GasTracker(web3, gas_model=gas_model, block_clock=block_clock))
+        notifier.close()
+    finally:
+        block_clock.stop()
+        oneinch_stand_in.stop()
+        telegram_stand_in.stop()
+
+    logger.info(f"Кэш eth_call: {call_cache.stats()}")
+    logger.info(f"Лимиты газа: {gas_model.predicted} из модели, {gas_model.estimated} через eth_estimateGas")
+    return {
+        "cycles": results,
+        "unwind": unwind_result,
+        "notifications": len(telegram_stand_in.messages),
+        "notification_retries": sum(telegram_stand_in.rejected.values()),
+        "stages": sorted(profiler.stage_times),
+    }
+
+
+def check_report(report: dict, max_rpc_per_wallet: float = MAX_RPC_PER_WALLET) -> list[str]:
+    """Нарушения ожидаемого поведения: ошибки кошельков, пустые депозиты, лишние запросы к ноде, незакрытые позиции.
+    Порог на кошелёк не учитывает фоновый опрос блоков (BACKGROUND_METHODS)"""
+    problems = []
+    for result in report["cycles"]:
+        cycle = result["cycle"]
+        per_wallet = result["wallet_rpc_requests"] / result["wallets"]
+        if result["failed"]:
+            problems.append(f"цикл {cycle}: ошибки у {result['failed']} кошельков")
+        if result["deposited"] <= 0:
+            problems.append(f"цикл {cycle}: в хранилище ничего не внесено")
+        if per_wallet > max_rpc_per_wallet:
+            problems.append(
+                f"цикл {cycle}: {per_wallet:.1f} запросов к ноде на кошелёк, допустимо {max_rpc_per_wallet}"
+            )
+
+    unwind_result = report["unwind"]
+    if unwind_result["failed"]:
+        problems.append(f"выход: не выполнено транзакций {unwind_result['failed']}")
+    if unwind_result["open_positions"]:
+        problems.append(f"выход: осталось открытых позиций {unwind_result['open_positions']}")
+    if report["notifications"] < len(report["cycles"]):
+        problems.append(f"доставлено уведомлений {report['notifications']} за {len(report['cycles'])} циклов")
+    if report["notification_retries"] < len(TELEGRAM_FAILURES):
+        problems.append("ответы 429 и 5xx заглушки Telegram не получены, повторы отправки не проверены")
+    if not report["stages"]:
+        problems.append("профиль не содержит этапов цикла")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность цикла компаундинга на локальных заглушках")
+    parser.add_argument("--wallets", type=int, default=200)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=MAX_PARALLEL_WALLETS)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка одного запроса к ноде, с")
+    parser.add_argument("--max-rpc-per-wallet", type=float, default=MAX_RPC_PER_WALLET)
+    args = parser.parse_args()
+
+    report = run_simulation(args.wallets, args.cycles, args.workers, args.latency)
+    for result in report["cycles"]:
+        per_wallet = result["wallet_rpc_requests"] / result["wallets"]
+        logger.info(
+            f"Цикл {result['cycle']}: {result['wallets']} кошельков за {result['seconds']:.2f} с "
+            f"({result['wallets_per_second']:.1f}/с), ошибок: {result['failed']}, "
+            f"транзакций: {result['transactions']}, запросов к ноде: {result['rpc_requests']} "
+            f"({per_wallet:.1f} на кошелёк без опроса блоков, {result['rpc_round_trips']} обращений), "
+            f"запросов к 1inch: {result['oneinch_requests']}, "
+            f"внесено в хранилище: {Web3.from_wei(result['deposited'], 'ether'):.4f} LP"
+        )
+        logger.info(f"Запросы по методам: {result['rpc_by_method']}")
+
+    unwind_result = report["unwind"]
+    logger.info(
+        f"Выход: {unwind_result['positions']} позиций за {unwind_result['seconds']:.2f} с, "
+        f"транзакций: {unwind_result['transactions']}, не выполнено: {unwind_result['failed']}, "
+        f"обращений к ноде: {unwind_result['rpc_round_trips']}, осталось позиций: {unwind_result['open_positions']}"
+    )
+    logger.info(
+        f"Уведомлений доставлено: {report['notifications']}, отказов Telegram: {report['notification_retries']}"
+    )
+    logger.info(f"Этапы профиля: {', '.join(report['stages'])}")
+
+    problems = check_report(report, args.max_rpc_per_wallet)
+    for problem in problems:
+        logger.error(f"Проверка не пройдена: {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
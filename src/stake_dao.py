@@ -8,8 +8,9 @@ from addresses import (
     STAKE_DAO_HARVESTER_ADDRESS,
     ZERO_ADDRESS,
 )
+from block_clock import BlockClock
 from config import ARBITRUM_RPC, PRIVATE_KEY, WALLET_ADDRESS
-from utils import build_approve_tx, get_allowance, get_gas_fees, send_tx
+from utils import build_approve_tx, get_allowance, send_tx, tx_params
 
 
 logging.basicConfig(
@@ -20,52 +21,54 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def build_deposit_tx(web3: Web3, wallet_address, vault_address, amount):
+def build_deposit_tx(web3: Web3, wallet_address, vault_address, amount, tx_overrides=None):
     contract = web3.eth.contract(
         address=Web3.to_checksum_address(vault_address),
         abi=abis.STAKE_DAO_VAULT,
     )
 
     tx = contract.functions.deposit(amount, ZERO_ADDRESS).build_transaction(
-        {
-            "from": wallet_address,
-            "nonce": web3.eth.get_transaction_count(wallet_address),
-            **get_gas_fees(web3),
-        }
+        tx_params(web3, wallet_address, tx_overrides)
     )
 
     return tx
 
 
-def build_withdraw_tx(web3: Web3, wallet_address, vault_address, amount):
+def build_withdraw_tx(web3: Web3, wallet_address, vault_address, amount, tx_overrides=None):
     contract = web3.eth.contract(
         address=Web3.to_checksum_address(vault_address),
         abi=abis.STAKE_DAO_VAULT,
     )
 
     tx = contract.functions.withdraw(amount, wallet_address, wallet_address).build_transaction(
-        {
-            "from": wallet_address,
-            "nonce": web3.eth.get_transaction_count(wallet_address),
-            **get_gas_fees(web3),
-        }
+        tx_params(web3, wallet_address, tx_overrides)
     )
 
     return tx
 
 
-def build_claim_tx(web3: Web3, wallet_address, gauges_addresses):
+def build_claim_tx(web3: Web3, wallet_address, gauges_addresses, tx_overrides=None):
     contract = web3.eth.contract(
         address=STAKE_DAO_HARVESTER_ADDRESS,
         abi=abis.STAKE_DAO_HARVERSTER,
     )
 
     tx = contract.functions.claim(gauges_addresses, [b"0x"]).build_transaction(
-        {
-            "from": wallet_address,
-            "nonce": web3.eth.get_transaction_count(wallet_address),
-            **get_gas_fees(web3),
-        }
+        tx_params(web3, wallet_address, tx_overrides)
+    )
+
+    return tx
+
+
+def build_vault_claim_tx(web3: Web3, wallet_address, vault_address, tokens, tx_overrides=None):
+    """Сбор дополнительных наград хранилища (getRewardTokens) в кошелёк"""
+    contract = web3.eth.contract(
+        address=Web3.to_checksum_address(vault_address),
+        abi=abis.STAKE_DAO_VAULT,
+    )
+
+    tx = contract.get_function_by_signature("claim(address[],address)")(tokens, wallet_address).build_transaction(
+        tx_params(web3, wallet_address, tx_overrides)
     )
 
     return tx
@@ -75,6 +78,7 @@ if __name__ == "__main__":
     # Инициализация Web3
     web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
     assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
+    block_clock = BlockClock(web3).start()
 
     amount = int(float(input("Введите количество LP токенов для добавления в vault: ")) * 10**18)
 
@@ -107,7 +111,7 @@ if __name__ == "__main__":
         tx_hash = send_tx(web3, approve_tx, PRIVATE_KEY)
         logger.info(f"Транзакция разрешения: {tx_hash}")
 
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = block_clock.wait_for_receipt(tx_hash)
         logger.info(f"Разрешение добавлено: {receipt}")
 
     # Совершаем добавление ликвидности
@@ -120,7 +124,7 @@ if __name__ == "__main__":
 
     # add_liquidity_tx_hash = send_tx(web3, add_liquidity_tx, PRIVATE_KEY)
     # logger.info(f"Транзакция депозита LP токена в vault: {add_liquidity_tx_hash}")
-    # receipt = web3.eth.wait_for_transaction_receipt(add_liquidity_tx_hash)
+    # receipt = block_clock.wait_for_receipt(add_liquidity_tx_hash)
     # logger.info(f"LP токен добавлен: {receipt}")
 
     # Собираем награды
@@ -134,7 +138,7 @@ if __name__ == "__main__":
 
     # claim_tx_hash = send_tx(web3, claim_tx, PRIVATE_KEY)
     # logger.info(f"Транзакция сбора наград: {claim_tx_hash}")
-    # receipt = web3.eth.wait_for_transaction_receipt(claim_tx_hash)
+    # receipt = block_clock.wait_for_receipt(claim_tx_hash)
     # logger.info(f"Награды собраны: {receipt}")
 
     # Выводим LP токены из Vault
@@ -147,5 +151,5 @@ if __name__ == "__main__":
 
     withdraw_tx_hash = send_tx(web3, withdraw_tx, PRIVATE_KEY)
     logger.info(f"Транзакция вывода LP токена из Vault: {withdraw_tx_hash}")
-    receipt = web3.eth.wait_for_transaction_receipt(withdraw_tx_hash)
+    receipt = block_clock.wait_for_receipt(withdraw_tx_hash)
     logger.info(f"LP токен выведен: {receipt}")
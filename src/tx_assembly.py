@@ -0,0 +1,94 @@
+import logging
+import time
+from functools import lru_cache
+
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import abi_to_signature, function_abi_to_4byte_selector, get_abi_input_types
+from web3 import Web3
+
+import abis
+from config import ARBITRUM_CHAIN_ID
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+BENCHMARK_ITERATIONS = 1000
+
+
+class FunctionEncoder:
+    """Кодировщик calldata одной функции: селектор и типы аргументов вычисляются один раз"""
+
+    def __init__(self, function_abi: dict):
+        self.signature = abi_to_signature(function_abi)
+        self.selector = function_abi_to_4byte_selector(function_abi)
+        self.types = get_abi_input_types(function_abi)
+
+    def encode(self, *args) -> bytes:
+        return self.selector + encode(self.types, args)
+
+
+@lru_cache(maxsize=None)
+def get_encoder(abi_name: str, signature: str) -> FunctionEncoder:
+    """Кодировщик функции по имени ABI из модуля abis и сигнатуре, например "withdraw(uint256,address,address)" """
+    for item in getattr(abis, abi_name):
+        if item.get("type") == "function" and abi_to_signature(item) == signature:
+            return FunctionEncoder(item)
+    raise ValueError(f"Функция {signature} не найдена в ABI {abi_name}")
+
+
+@lru_cache(maxsize=None)
+def get_account(private_key: str):
+    """Один объект аккаунта на ключ: разбор приватного ключа не повторяется при каждой подписи"""
+    return Account.from_key(private_key)
+
+
+def predict_gas(gas_model, to, data: bytes, gas_for_l1: int, fallback: int) -> int:
+    """Лимит газа без eth_estimateGas: L2-часть из модели по прошлым квитанциям или запасная fallback,
+    плюс текущая L1-часть gas_for_l1"""
+    predicted = gas_model.predict(to, Web3.to_hex(data), gas_for_l1) if gas_model is not None else None
+    return fallback + gas_for_l1 if predicted is None else predicted
+
+
+def assemble_tx(wallet_address, to, data: bytes, gas: int, tx_overrides: dict) -> dict:
+    """Транзакция EIP-1559 целиком из локального состояния: ни одного запроса к ноде.
+    tx_overrides содержит nonce и комиссии, а также value, если нужно"""
+    return {
+        "type": 2,
+        "chainId": ARBITRUM_CHAIN_ID,
+        "from": wallet_address,
+        "to": to,
+        "data": data,
+        "value": 0,
+        "gas": gas,
+        **tx_overrides,
+    }
+
+
+if __name__ == "__main__":
+    # Замер подготовки транзакции без сети: кодирование, сборка и подпись
+    account = Account.create()
+    withdraw = get_encoder("STAKE_DAO_VAULT", "withdraw(uint256,address,address)")
+    fees = {"maxFeePerGas": 20_000_000, "maxPriorityFeePerGas": 0}
+
+    started = time.perf_counter()
+    for nonce in range(BENCHMARK_ITERATIONS):
+        data = withdraw.encode(10**18, account.address, account.address)
+    encoded = time.perf_counter()
+    for nonce in range(BENCHMARK_ITERATIONS):
+        tx = assemble_tx(account.address, account.address, data, 1_000_000, {"nonce": nonce, **fees})
+    assembled = time.perf_counter()
+    for nonce in range(BENCHMARK_ITERATIONS):
+        account.sign_transaction(
+            assemble_tx(account.address, account.address, data, 1_000_000, {"nonce": nonce, **fees})
+        )
+    signed = time.perf_counter()
+
+    logger.info(f"Кодирование calldata: {(encoded - started) / BENCHMARK_ITERATIONS * 1e6:.1f} мкс")
+    logger.info(f"Сборка транзакции: {(assembled - encoded) / BENCHMARK_ITERATIONS * 1e6:.1f} мкс")
+    logger.info(f"Сборка и подпись: {(signed - assembled) / BENCHMARK_ITERATIONS * 1e6:.1f} мкс")
@@ -0,0 +1,223 @@
+import argparse
+import logging
+import sys
+from typing import NamedTuple
+
+from web3 import Web3
+
+import abis
+from addresses import GMAC_CRVUSD_ETH_POOL_ADDRESS, GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS
+from block_clock import BlockClock
+from config import ARBITRUM_RPC
+from gas_cost import l1_gas_call, l1_gas_for_data
+from gas_model import GasLimitModel
+from multi_wallet import load_wallets
+from tx_assembly import assemble_tx, get_encoder, predict_gas
+from utils import GasTracker, get_gas_fees
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+# Позиции для выхода: (хранилище StakeDAO, пул Curve — он же LP токен, индекс монеты на выходе)
+UNWIND_POSITIONS = ((GMAC_CRVUSD_ETH_STAKE_DAO_VAULT_ADDRESS, GMAC_CRVUSD_ETH_POOL_ADDRESS, 0),)  # crvUSD
+
+# L2-часть лимитов газа, если модель ещё не видела этих действий: eth_estimateGas для вывода ликвидности
+# до подтверждения вывода из хранилища отменяется, ведь LP токенов в кошельке ещё нет
+WITHDRAW_GAS_LIMIT = 1_000_000
+REMOVE_LIQUIDITY_GAS_LIMIT = 1_500_000
+# L1-часть на байт calldata, если NodeInterface не ответил: с большим запасом к обычным десяткам единиц
+UNWIND_L1_GAS_PER_BYTE = 2_000
+UNWIND_SLIPPAGE = 1.0  # %, минимумы считаются по calc_withdraw_one_coin
+PRIORITY_FEE_MULTIPLIER = 3
+
+
+class UnwindLeg(NamedTuple):
+    """Выход из одной позиции: вывод из хранилища и вывод ликвидности в одну монету"""
+
+    vault: str
+    pool: str
+    coin_index: int
+    withdraw_amount: int  # LP токены в хранилище
+    lp_amount: int  # Всего LP токенов после вывода из хранилища
+    min_amount: int
+
+
+class WalletUnwind(NamedTuple):
+    """Выход одного кошелька: его позиции и nonce, с которого начинается цепочка транзакций"""
+
+    address: str
+    nonce: int
+    legs: list[UnwindLeg]
+
+
+def read_legs(web3: Web3, wallet_addresses, positions=UNWIND_POSITIONS, slippage: float = UNWIND_SLIPPAGE):
+    """Позиции и nonce всех кошельков: размеры позиций и nonce одним пакетным запросом,
+    минимумы вывода вторым, сколько бы ни было кошельков"""
+    if not wallet_addresses:
+        return []
+    vaults = [web3.eth.contract(address=vault, abi=abis.STAKE_DAO_VAULT) for vault, _, _ in positions]
+    pools = [web3.eth.contract(address=pool, abi=abis.CURVE_TRICRYPTO_POOL) for _, pool, _ in positions]
+
+    with web3.batch_requests() as batch:
+        for address in wallet_addresses:
+            batch.add(web3.eth.get_transaction_count(address, "pending"))
+            for vault, pool in zip(vaults, pools):
+                batch.add(vault.functions.maxWithdraw(address))
+                batch.add(pool.functions.balanceOf(address))
+        results = batch.execute()
+
+    stride = 1 + 2 * len(positions)
+    nonces = {}
+    active = []  # (адрес кошелька, индекс позиции, LP токены в хранилище, всего LP токенов)
+    for j, address in enumerate(wallet_addresses):
+        row = results[j * stride : (j + 1) * stride]
+        nonces[address] = row[0]
+        for i, (deposited, held) in enumerate(zip(row[1::2], row[2::2])):
+            if deposited + held:
+                active.append((address, i, deposited, deposited + held))
+    if not active:
+        return []
+
+    with web3.batch_requests() as batch:
+        for _, i, _, lp_amount in active:
+            batch.add(pools[i].functions.calc_withdraw_one_coin(lp_amount, positions[i][2]))
+        coin_amounts = batch.execute()
+
+    legs: dict[str, list[UnwindLeg]] = {}
+    for (address, i, withdraw_amount, lp_amount), coin_amount in zip(active, coin_amounts):
+        min_amount = int(coin_amount * (1 - slippage / 100))
+        legs.setdefault(address, []).append(UnwindLeg(*positions[i], withdraw_amount, lp_amount, min_amount))
+    return [WalletUnwind(address, nonces[address], wallet_legs) for address, wallet_legs in legs.items()]
+
+
+def aggressive_fees(web3: Web3, multiplier: float = PRIORITY_FEE_MULTIPLIER) -> dict:
+    """Комиссии для экстренного выхода: завышенный приоритет и двойной запас по baseFee,
+    чтобы всплеск baseFee не оставил часть цепочки транзакций в мемпуле"""
+    fees = get_gas_fees(web3)
+    priority = int(fees["maxPriorityFeePerGas"] * multiplier)
+    return {
+        "maxPriorityFeePerGas": priority,
+        "maxFeePerGas": fees["maxFeePerGas"] * 2 + priority,
+    }
+
+
+def build_unwind_txs(web3: Web3, unwinds, fees: dict, gas_model: GasLimitModel | None = None):
+    """Цепочки транзакций выхода всех кошельков с последовательными nonce; список (кошелёк, название, транзакция).
+    Лимиты газа задаём сами без eth_estimateGas: L2-часть из модели, L1-часть — одним пакетным запросом на всех"""
+    withdraw = get_encoder("STAKE_DAO_VAULT", "withdraw(uint256,address,address)")
+    remove_liquidity = get_encoder("CURVE_TRICRYPTO_POOL", "remove_liquidity_one_coin(uint256,uint256,uint256)")
+
+    calls = []  # (кошелёк, название, адрес, calldata, запасной лимит L2-части)
+    for unwind in unwinds:
+        for leg in unwind.legs:
+            if leg.withdraw_amount:
+                data = withdraw.encode(leg.withdraw_amount, unwind.address, unwind.address)
+                calls.append((unwind.address, "Вывод LP токена из StakeDAO Vault", leg.vault, data, WITHDRAW_GAS_LIMIT))
+            data = remove_liquidity.encode(leg.lp_amount, leg.coin_index, leg.min_amount)
+            calls.append((unwind.address, "Вывод ликвидности Curve", leg.pool, data, REMOVE_LIQUIDITY_GAS_LIMIT))
+    if not calls:
+        return []
+
+    try:
+        with web3.batch_requests() as batch:
+            for _, _, to, data, _ in calls:
+                batch.add(l1_gas_call(web3, to, data))
+            l1_gas = [gas_for_l1 for gas_for_l1, _, _ in batch.execute()]
+    except Exception as e:
+        # Выход не должен срываться из-за оценки: берём L1-часть по длине calldata с запасом
+        logger.warning(f"Не удалось оценить L1-часть газа выхода, лимит по длине calldata: {e}")
+        l1_gas = [l1_gas_for_data(data, UNWIND_L1_GAS_PER_BYTE) for _, _, _, data, _ in calls]
+
+    nonces = {unwind.address: unwind.nonce for unwind in unwinds}
+    txs = []
+    for (address, name, to, data, fallback), gas_for_l1 in zip(calls, l1_gas):
+        gas = predict_gas(gas_model, to, data, gas_for_l1, fallback)
+        txs.append((address, name, assemble_tx(address, to, data, gas, {"nonce": nonces[address], **fees})))
+        nonces[address] += 1
+    return txs
+
+
+def broadcast(web3: Web3, signed_txs) -> list[dict | None]:
+    """Отправляет все подписанные транзакции одним пакетным запросом; ошибка ноды по каждой транзакции или None.
+    web3.batch_requests не поддерживает eth_sendRawTransaction, поэтому пакет передаём провайдеру напрямую"""
+    responses = web3.provider.make_batch_request(
+        [("eth_sendRawTransaction", [web3.to_hex(signed_tx.raw_transaction)]) for signed_tx in signed_txs]
+    )
+    if not isinstance(responses, list):
+        # Нода отклонила пакет целиком и вернула один ответ с ошибкой
+        raise ValueError(f"Пакет транзакций отклонён: {responses.get('error')}")
+    return [response.get("error") for response in responses]
+
+
+def wait_for_unwind(gas_tracker: GasTracker, txs, signed_txs, errors) -> list[str]:
+    """Ждёт квитанции принятых нодой транзакций; возвращает названия несостоявшихся.
+    Следующие nonce кошелька после отклонённой транзакции в блок не попадут, поэтому их не ждём"""
+    failed = []
+    rejected = set()  # кошельки с отклонённой нодой транзакцией
+    for (address, action, _), signed_tx, error in zip(txs, signed_txs, errors):
+        name, tx_hash = f"{action} {address}", Web3.to_hex(signed_tx.hash)
+        if error is not None:
+            logger.error(f"Нода отклонила транзакцию {name}: {error}")
+            rejected.add(address)
+            failed.append(name)
+        elif address in rejected:
+            logger.error(f"Транзакция {name} ждёт отклонённый nonce и не будет включена в блок: {tx_hash}")
+            failed.append(name)
+        elif gas_tracker.add_transaction(name, tx_hash)["status"] != 1:
+            logger.error(f"Транзакция {name} отменена: {tx_hash}")
+            failed.append(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экстренный выход из всех позиций всех кошельков")
+    parser.add_argument("--slippage", type=float, default=UNWIND_SLIPPAGE, help="допустимое проскальзывание, %%")
+    parser.add_argument("--priority-multiplier", type=float, default=PRIORITY_FEE_MULTIPLIER)
+    parser.add_argument("--dry-run", action="store_true", help="подписать транзакции, но не отправлять")
+    args = parser.parse_args()
+
+    web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
+    assert web3.is_connected(), "Не удалось подключиться к сети Arbitrum"
+
+    gas_model = GasLimitModel()
+    fees = aggressive_fees(web3, args.priority_multiplier)
+
+    # Сначала подписываем всё для всех кошельков, потом отправляем разом
+    wallets = {wallet.address: wallet for wallet in load_wallets()}
+    unwinds = read_legs(web3, list(wallets), slippage=args.slippage)
+    for unwind in unwinds:
+        for leg in unwind.legs:
+            logger.info(f"{unwind.address}: {leg}")
+    txs = build_unwind_txs(web3, unwinds, fees, gas_model)
+    signed_txs = [wallets[address].sign(tx) for address, _, tx in txs]
+
+    if not signed_txs:
+        logger.info("Открытых позиций нет")
+        return
+    if args.dry_run:
+        for (address, name, _), signed_tx in zip(txs, signed_txs):
+            logger.info(f"{name} {address}: {web3.to_hex(signed_tx.hash)}")
+        return
+
+    block_clock = BlockClock(web3).start()
+    gas_tracker = GasTracker(web3, gas_model=gas_model, block_clock=block_clock)
+    try:
+        errors = broadcast(web3, signed_txs)
+        logger.info(f"Нода приняла транзакций: {errors.count(None)} из {len(errors)}")
+        failed = wait_for_unwind(gas_tracker, txs, signed_txs, errors)
+        gas_tracker.print_summary()
+    finally:
+        block_clock.stop()
+
+    if failed:
+        logger.error(f"Не выполнены транзакции выхода: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
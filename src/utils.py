@@ -1,10 +1,15 @@
+import json
 import logging
+import os
 import random
 from decimal import Decimal
 
 from web3 import Web3
 
 import abis
+from config import ARBITRUM_CHAIN_ID
+from gas_cost import receipt_gas_for_l1, split_receipt_cost
+from tx_assembly import get_account
 
 
 logging.basicConfig(
@@ -18,25 +23,41 @@ logger = logging.getLogger(__name__)
 class GasTracker:
     """Класс для отслеживания газовых затрат"""
 
-    def __init__(self, web3: Web3):
+    def __init__(self, web3: Web3, notifier=None, gas_model=None, block_clock=None):
         self.web3 = web3
-        self.transactions: list[tuple[str, int, int, int | Decimal]] = []  # (name, gas_used, gas_price, cost_eth)
-
-    def add_transaction(self, name: str, tx_hash) -> None:
-        """Добавляет транзакцию для отслеживания газа"""
-        receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+        self.notifier = notifier  # Итог и ошибки цикла кошелька; отдельные транзакции в уведомления не попадают
+        self.gas_model = gas_model
+        self.block_clock = block_clock
+        # (name, gas_used, gas_price, cost_eth, l1_cost_eth)
+        self.transactions: list[tuple[str, int, int, int | Decimal, int | Decimal]] = []
+
+    def add_transaction(self, name: str, tx_hash):
+        """Добавляет транзакцию для отслеживания газа и возвращает её квитанцию"""
+        if self.block_clock is not None:
+            receipt = self.block_clock.wait_for_receipt(tx_hash)
+        else:
+            receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
         gas_used = receipt["gasUsed"]
 
         # Получаем транзакцию для получения gas price
         tx = self.web3.eth.get_transaction(tx_hash)
         gas_price = tx["gasPrice"]
 
-        # Вычисляем стоимость в ETH
+        # Вычисляем стоимость в ETH; на Arbitrum часть газа уходит на публикацию calldata в L1
         cost_wei = gas_used * gas_price
         cost_eth = Web3.from_wei(cost_wei, "ether")
+        l1_cost_eth = Web3.from_wei(split_receipt_cost(receipt, gas_price)[1], "ether")
+
+        self.transactions.append((name, gas_used, gas_price, cost_eth, l1_cost_eth))
+        if self.gas_model is not None:
+            l2_gas_used = gas_used - receipt_gas_for_l1(receipt)
+            self.gas_model.record(tx["to"], Web3.to_hex(tx["input"]), l2_gas_used, receipt["status"] == 1)
+        logger.info(
+            f"Gas для {name}: {gas_used:,} единиц, цена: {gas_price:,} wei, "
+            f"стоимость: {cost_eth:.6f} ETH (L1: {l1_cost_eth:.6f} ETH)"
+        )
 
-        self.transactions.append((name, gas_used, gas_price, cost_eth))
-        logger.info(f"Gas для {name}: {gas_used:,} единиц, цена: {gas_price:,} wei, стоимость: {cost_eth:.6f} ETH")
+        return receipt
 
     def get_total_cost(self) -> tuple[int, int | Decimal]:
         """Возвращает общие затраты газа"""
@@ -44,6 +65,10 @@ class GasTracker:
         total_cost_eth = sum(tx[3] for tx in self.transactions)
         return total_gas, total_cost_eth
 
+    def get_l1_cost(self) -> int | Decimal:
+        """Возвращает часть затрат, пришедшуюся на публикацию данных в L1"""
+        return sum(tx[4] for tx in self.transactions)
+
     def print_summary(self) -> None:
         """Выводит сводку по газовым затратам"""
         if not self.transactions:
@@ -54,18 +79,18 @@ class GasTracker:
         print("СВОДКА ГАЗОВЫХ ЗАТРАТ")
         print("=" * 80)
 
-        for i, (name, gas_used, gas_price, cost_eth) in enumerate(self.transactions, 1):
+        for i, (name, gas_used, gas_price, cost_eth, l1_cost_eth) in enumerate(self.transactions, 1):
             print(f"{i}. {name}")
             print(f"   Газ использован: {gas_used:,} единиц")
             print(f"   Цена газа: {gas_price:,} wei ({gas_price / 10**9:.2f} gwei)")
-            print(f"   Стоимость: {cost_eth:.6f} ETH")
+            print(f"   Стоимость: {cost_eth:.6f} ETH (L2: {cost_eth - l1_cost_eth:.6f}, L1: {l1_cost_eth:.6f})")
             print()
 
         total_gas, total_cost_eth = self.get_total_cost()
         print("-" * 80)
         print("ИТОГО:")
         print(f"Общий газ: {total_gas:,} единиц")
-        print(f"Общая стоимость: {total_cost_eth:.6f} ETH")
+        print(f"Общая стоимость: {total_cost_eth:.6f} ETH (из них L1: {self.get_l1_cost():.6f} ETH)")
 
         # Получаем текущую цену ETH для конвертации в USD (опционально)
         try:
@@ -88,12 +113,27 @@ def get_gas_fees(web3: Web3):
         priority = rewards[mid] if len(rewards) % 2 else (rewards[mid - 1] + rewards[mid]) // 2
         priority = int(priority * random.uniform(1.01, 1.03))
 
+    return fees_for_base_fee(base_fee, priority)
+
+
+def fees_for_base_fee(base_fee: int, priority: int) -> dict:
     return {
         "maxPriorityFeePerGas": priority,
         "maxFeePerGas": max(base_fee + priority, int(base_fee * 1.05)),
     }
 
 
+def tx_params(web3: Web3, wallet_address, tx_overrides: dict | None = None) -> dict:
+    """Общие параметры транзакции: nonce и комиссии, которых нет в tx_overrides, запрашиваем у ноды.
+    chainId задаём сами, иначе build_transaction запрашивает eth_chainId при каждой сборке"""
+    params = {"from": wallet_address, "chainId": ARBITRUM_CHAIN_ID, **(tx_overrides or {})}
+    if "nonce" not in params:
+        params["nonce"] = web3.eth.get_transaction_count(wallet_address)
+    if "maxFeePerGas" not in params:
+        params.update(get_gas_fees(web3))
+    return params
+
+
 def build_approve_tx(web3: Web3, wallet_address, token_address, spender, amount):
     """Выдача разрешения на использование токенов"""
     contract = web3.eth.contract(
@@ -104,20 +144,13 @@ def build_approve_tx(web3: Web3, wallet_address, token_address, spender, amount)
     tx = contract.functions.approve(
         Web3.to_checksum_address(spender),
         amount,
-    ).build_transaction(
-        {
-            "from": wallet_address,
-            "nonce": web3.eth.get_transaction_count(wallet_address),
-            "chainId": 42161,
-            **get_gas_fees(web3),
-        }
-    )
+    ).build_transaction(tx_params(web3, wallet_address))
 
     return tx
 
 
 def send_tx(web3: Web3, tx, private_key):
-    signed_tx = web3.eth.account.sign_transaction(tx, private_key)
+    signed_tx = get_account(private_key).sign_transaction(tx)
     tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
     return web3.to_hex(tx_hash)
 
@@ -161,3 +194,14 @@ def approve(web3: Web3, wallet_address, token_address, spender, balance, private
     tx_hash = send_tx_with_tracking(web3, approve_tx, private_key, gas_tracker, "Разрешение токена")
 
     return tx_hash
+
+
+def write_json_atomic(path: str, data) -> None:
+    """Пишет JSON во временный файл и атомарно подменяет им path, чтобы не оставить файл наполовину записанным"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
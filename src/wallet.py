@@ -0,0 +1,78 @@
+import logging
+import threading
+
+from web3 import Web3
+
+from tx_assembly import get_account
+from utils import GasTracker, get_allowance
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+
+class Wallet:
+    """Кошелёк с собственным подписантом, счётчиком nonce и известными разрешениями"""
+
+    def __init__(self, private_key: str):
+        self.account = get_account(private_key)
+        self.address = self.account.address
+        self.allowances: dict[tuple[str, str], int] = {}  # (token, spender) -> остаток разрешения
+        self._nonce: int | None = None
+        self._lock = threading.Lock()
+
+    def next_nonce(self, web3: Web3) -> int:
+        """Выдаёт следующий nonce, запрашивая его у ноды только при первом обращении"""
+        with self._lock:
+            if self._nonce is None:
+                self._nonce = web3.eth.get_transaction_count(self.address, "pending")
+            nonce = self._nonce
+            self._nonce += 1
+            return nonce
+
+    def reset_nonce(self) -> None:
+        """Сбрасывает локальный nonce, следующий будет заново прочитан из сети"""
+        with self._lock:
+            self._nonce = None
+
+    def sign(self, tx: dict):
+        """Подписывает транзакцию локально, без обращения к ноде"""
+        return self.account.sign_transaction(tx)
+
+    def send(self, web3: Web3, tx: dict, gas_tracker: GasTracker, tx_name: str, on_signed=None):
+        """Подписывает и отправляет транзакцию, возвращает квитанцию после включения в блок"""
+        signed_tx = self.sign(tx)
+        tx_hash = web3.to_hex(signed_tx.hash)
+        if on_signed is not None:
+            # Хэш известен до отправки, поэтому его можно сохранить и сверить после перезапуска
+            on_signed(tx_hash)
+
+        try:
+            web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Exception:
+            # Nonce мог остаться неиспользованным — перечитаем его перед следующей транзакцией
+            self.reset_nonce()
+            raise
+
+        return gas_tracker.add_transaction(tx_name, tx_hash)
+
+    def reserve_allowance(self, web3: Web3, token_address, spender, amount) -> bool:
+        """Списывает amount с известного разрешения; False — разрешения не хватает и его нужно выдать на amount"""
+        key = (token_address, spender)
+        allowance = self.allowances.get(key, 0)
+        if allowance < amount:
+            allowance = get_allowance(
+                web3=web3,
+                wallet_address=self.address,
+                token_address=token_address,
+                spender=spender,
+            )
+
+        # Разрешение расходуется следующей транзакцией, поэтому сразу запоминаем остаток;
+        # недостающее разрешение выдаётся ровно на amount и тоже расходуется полностью
+        self.allowances[key] = max(allowance - amount, 0)
+        return allowance >= amount